@@ -1,18 +1,51 @@
 import pandas as pd
+import numpy as np
 import html
 import json
 import os
+import gzip
+import hashlib
+import sqlite3
+from bisect import bisect_left
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import pytz  # <--- Added pytz for NZ Time
 
+from RunReport import RunReport
+
+try:
+    import brotli  # optional: only needed for the .br copies written with PRECOMPRESS
+except ImportError:
+    brotli = None
+
 # ---- Configuration ----
 IN_CSV = "jbhifi_products_with_category.csv"
+IN_TYPED = "jbhifi_products_with_category.npz"  # typed copy of IN_CSV from ScraperBetterTitle.py, used when current
 HOTLINKS_CSV = "hotlinks.csv"
 OUT_HTML = "index.html" # <--- Changed to index.html for GitHub Pages
 WHATS_NEW_FILE = "whatsnew.txt"
+HISTORY_DB = "price_history.db"  # written by ScraperBetterTitle.py; optional
+SITE_REPORT = "site_report.json"  # phase timings and sizes for the last build, see RunReport.py
+
+# Deal data is written as content-hashed shard files in DATA_DIR (next to
+# OUT_HTML) that the page fetches on demand. Set DATA_DIR = None to inline
+# everything in the page instead, e.g. to open index.html straight from disk.
+DATA_DIR = "data"
+DISCOUNT_BANDS = [50, 30, 20, 15, 0]  # shard lower bounds in % off, biggest deals first; 0% gets its own shard
+# .gz / .br copies of each data file only help hosts that serve a precompressed sibling when the browser
+# accepts it (nginx gzip_static / brotli_static, Caddy's precompressed). GitHub Pages, which serves this repo,
+# ignores them and gzips on the fly, and committing a day's worth of already-compressed blobs for git to keep
+# forever buys nothing there, so they are only written with PRECOMPRESS = True.
+PRECOMPRESS = False
+COMPRESS_WORKERS = 4  # threads compressing .gz / .br copies; zlib and brotli release the GIL
+BROTLI_QUALITY = 9  # 11 is ~15% smaller but ~20x slower, and took nearly all of the build
+DELTA_CHAIN = 14  # daily delta files kept; visitors with an older copy download the full data again
 
 # Base URL for constructing links from handles
 BASE_URL = "https://www.jbhifi.co.nz/products/"
+TIMEZONE = "Pacific/Auckland"  # for the "last updated" time shown on the page
 
 # ---- Utility Functions ----
 def esc(x):
@@ -44,36 +77,181 @@ def fmt_price(val):
         s = str(val).strip()
         return esc(s)
 
+TITLE_FIXES = [(" 4k ", " 4K "), (" Hd", " HD"), (" Ps5", " PS5"), (" Ps4", " PS4")]
+
 def format_title_from_handle(handle):
     if pd.isna(handle) or handle == "":
         return "Unknown Product"
     text = str(handle).replace("-", " ")
     formatted = text.title()
-    formatted = formatted.replace(" 4k ", " 4K ").replace(" Hd", " HD").replace(" Ps5", " PS5").replace(" Ps4", " PS4")
+    for old, new in TITLE_FIXES:
+        formatted = formatted.replace(old, new)
     return formatted
 
-def generate_hotlinks_html():
+# ---- Column-wise versions of the helpers above (used by deal_columns, for build_columnar_payload) ----
+def column(df, name, default=np.nan):
+    if name in df.columns:
+        return df[name]
+    return pd.Series([default] * len(df), index=df.index, dtype=object)
+
+def str_or_blank(col):
+    """Vectorized str(x or "") — falsy cells become "", NaN stays "nan"."""
+    if pd.api.types.is_integer_dtype(col):
+        text = pd.Series(col.to_numpy().astype(str), index=col.index, dtype=object)
+    else:
+        col = col.astype(object)
+        if pd.api.types.infer_dtype(col, skipna=True) in ("string", "empty"):
+            text = col.where(col.notna(), "nan")
+        else:
+            text = col.map(str)
+    return text.mask(col.isin([0, ""]), "")
+
+def numeric_prices(col):
+    """Vectorized to_numeric_price: a float array with NaN where it returns None."""
+    if pd.api.types.is_numeric_dtype(col):
+        return col.to_numpy(dtype=float, na_value=np.nan)
+    s = col.astype(object).map(lambda x: x if pd.isna(x) else str(x).strip().replace("$", "").replace(",", ""))
+    return pd.to_numeric(s.mask(s == ""), errors="coerce").to_numpy(dtype=float)
+
+def fmt_prices(values):
+    """fmt_price over a float array, formatting each distinct price only once."""
+    uniq = pd.unique(values[~np.isnan(values)])
+    lookup = {v: f"${v:,.2f}" for v in uniq.tolist()}
+    return ["" if v != v else lookup[v] for v in values.tolist()]
+
+def format_titles(sources):
+    """format_title_from_handle over a list of strings.
+
+    The strings are joined with NUL, which str.title() treats as a word break,
+    so one pass of each str method over the joined text transforms every
+    string exactly as it would on its own.
+    """
+    joined = "\0".join(sources)
+    if joined.count("\0") != max(len(sources) - 1, 0):
+        return [format_title_from_handle(x) for x in sources]
+    text = joined.replace("-", " ").title()
+    for old, new in TITLE_FIXES:
+        text = text.replace(old, new)
+    titles = text.split("\0") if sources else []
+    return [t if x else "Unknown Product" for t, x in zip(titles, sources)]
+
+def clean_categories(col):
+    """The category rule per distinct value: stripped text, blanks/NaN -> "Other"."""
+    codes, uniques = pd.factorize(col.astype(object), use_na_sentinel=False)
+    cleaned = []
+    for value in uniques.tolist():
+        cat = str(value).strip()
+        cleaned.append("Other" if not cat or cat.lower() == "nan" else cat)
+    return np.array(cleaned, dtype=object)[codes] if len(codes) else np.array([], dtype=object)
+
+DEAL_COLUMNS = ["Product ID", "Variant ID", "Handle", "Title", "Original Price", "Discounted Price", "Discount %", "Category"]
+TEXT_COLUMNS = {"Handle", "Title", "Category"}
+
+def text_column(values):
+    """Strings as pd.read_csv would load them: empty ones become NaN."""
+    values = pd.Series(values, dtype=object)
+    return values.mask(values == "")
+
+def rows_frame(rows):
+    """Rows as ScraperBetterTitle.product_rows() yields them, as the DataFrame read_deals() gives for them."""
+    columns = list(zip(*rows)) or [()] * len(DEAL_COLUMNS)
+    return pd.DataFrame({
+        name: text_column(values) if name in TEXT_COLUMNS
+        else np.array(values, dtype=np.int64 if name.endswith(" ID") else np.float64)
+        for name, values in zip(DEAL_COLUMNS, columns)
+    })
+
+class DealStream:
+    """deal_columns() built a batch at a time from scraper rows as pages arrive.
+
+    Pass add as scrape()'s on_rows. Every step of deal_columns() works row by
+    row, so joining the batches gives exactly what it returns for the
+    finished CSV, and only the whole-catalogue work is left for after the
+    crawl.
+    """
+
+    def __init__(self, batch_rows=2000):
+        self.batch_rows = batch_rows
+        self.pending = []
+        self.parts = []
+
+    def add(self, rows):
+        self.pending.extend(rows)
+        if len(self.pending) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if self.pending or not self.parts:
+            self.parts.append(deal_columns(rows_frame(self.pending)))
+            self.pending = []
+
+    def columns(self):
+        self.flush()
+        return {
+            key: np.concatenate([part[key] for part in self.parts]) if isinstance(self.parts[0][key], np.ndarray)
+            else [x for part in self.parts for x in part[key]]
+            for key in self.parts[0]
+        }
+
+def read_deals():
+    """The scraped rows as a DataFrame, from IN_TYPED when it is at least as new as IN_CSV.
+
+    IN_TYPED (see TypedExport in ScraperBetterTitle.py) holds IDs and
+    prices already parsed. Its text columns come back with empty strings as
+    NaN, the way pd.read_csv leaves them, so either source gives the same
+    page.
+    """
+    if os.path.exists(IN_TYPED) and (not os.path.exists(IN_CSV)
+                                     or os.path.getmtime(IN_TYPED) >= os.path.getmtime(IN_CSV)):
+        try:
+            with np.load(IN_TYPED) as typed:
+                data = {}
+                for name in typed.files:
+                    values = typed[name]
+                    if values.dtype == np.uint8:
+                        values = text_column(values.tobytes().decode("utf-8").split("\0")[:-1])
+                    data[name] = values
+            lengths = {len(v) for v in data.values()}
+            if len(lengths) > 1:
+                raise ValueError(f"columns of different lengths {sorted(lengths)}")
+            return pd.DataFrame(data)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable {IN_TYPED}: {e}")
+    try:
+        return pd.read_csv(IN_CSV)
+    except FileNotFoundError:
+        print(f"Error: Input file '{IN_CSV}' not found.")
+        return pd.DataFrame(columns=DEAL_COLUMNS)
+
+def read_hotlinks():
+    """(label, term) pairs from HOTLINKS_CSV, with or without a header row."""
     if not os.path.exists(HOTLINKS_CSV):
-        return ""
+        return []
     try:
         df_hot = pd.read_csv(HOTLINKS_CSV, header=None)
         first_cell = str(df_hot.iloc[0,0]).lower()
         if "heading" in first_cell or "label" in first_cell:
             df_hot = pd.read_csv(HOTLINKS_CSV)
             df_hot.columns = range(df_hot.shape[1])
-        
-        html_out = '<div class="hotlinks-section">'
-        html_out += '<span class="hotlinks-label">Quick Search:</span>'
-        html_out += '<div class="hotlinks-grid">'
-        for _, row in df_hot.iterrows():
-            if pd.isna(row[0]) or pd.isna(row[1]): continue
-            label = str(row[0]).strip()
-            term = str(row[1]).strip()
-            html_out += f'<button class="btn hotlink-btn" onclick="runHotlink(\'{esc(term)}\')">{esc(label)}</button>'
-        html_out += '</div></div>'
-        return html_out
+        return [
+            (str(row[0]).strip(), str(row[1]).strip())
+            for _, row in df_hot.iterrows()
+            if not (pd.isna(row[0]) or pd.isna(row[1]))
+        ]
     except Exception:
+        return []
+
+def generate_hotlinks_html(hotlinks=None):
+    hotlinks = read_hotlinks() if hotlinks is None else hotlinks
+    if not hotlinks:
         return ""
+    html_out = '<div class="hotlinks-section">'
+    html_out += '<span class="hotlinks-label">Quick Search:</span>'
+    html_out += '<div class="hotlinks-grid">'
+    for label, term in hotlinks:
+        html_out += f'<button class="btn hotlink-btn" onclick="runHotlink(\'{esc(term)}\')">{esc(label)}</button>'
+    html_out += '</div></div>'
+    return html_out
 
 def generate_category_filters_html(cat_list):
     if not cat_list: return ""
@@ -85,76 +263,586 @@ def generate_category_filters_html(cat_list):
     html_out += "</div>"
     return html_out
 
-# ---- Main Processing ----
-try:
-    df = pd.read_csv(IN_CSV)
-except FileNotFoundError:
-    print(f"Error: Input file '{IN_CSV}' not found.")
-    df = pd.DataFrame(columns=["Product ID", "Variant ID", "Handle", "Title", "Original Price", "Discounted Price", "Discount %", "Category"])
-
-deals_payload = []
-unique_categories = set()
-
-print(f"Processing {len(df)} rows...")
-
-for idx, row in df.iterrows():
-    pid = str(row.get("Product ID", "") or "")
-    raw_handle = str(row.get("Handle", "") or "")
-    
-    if not raw_handle or raw_handle == "nan":
-        raw_handle = str(row.get("Title", "") or "")
-        formatting_source = raw_handle
-        link_url = "#" 
+def deal_columns(df):
+    """Compute every field of the deals table as a column from the scraped CSV.
+
+    Works a column at a time instead of per row; the values are identical to
+    running the helpers above on every row.
+    """
+    pid = str_or_blank(column(df, "Product ID", ""))
+
+    handle = str_or_blank(column(df, "Handle", ""))
+    has_handle = (handle != "") & (handle != "nan")
+    source = handle.where(has_handle, str_or_blank(column(df, "Title", "")))
+
+    orig = numeric_prices(column(df, "Original Price"))
+    disc = numeric_prices(column(df, "Discounted Price"))
+
+    # `if pct_raw:` — NaN is truthy (and parses to None -> 0), only 0 falls through
+    pct_raw = column(df, "Discount %")
+    pct_falsy = pct_raw.astype(object).isin([0, ""]).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_calc = np.where((orig > 0) & (disc != 0) & ~np.isnan(disc), (orig - disc) / orig * 100, 0.0)
+    pct = np.where(pct_falsy, pct_calc, np.nan_to_num(numeric_prices(pct_raw), nan=0.0))
+
+    return {
+        "title": format_titles(source.tolist()),
+        "pid": pid.tolist(),
+        "vid": str_or_blank(column(df, "Variant ID", "")).tolist(),
+        "handle": handle.where(has_handle, "").tolist(),
+        "orig": orig,
+        "disc": disc,
+        "pct": pct,
+        "category": clean_categories(column(df, "Category", "Other")),
+    }
+
+def price_history(cols, path=HISTORY_DB):
+    """Lowest-ever price ("low") and, for deals cheaper than in the previous run, the price before ("prev").
+
+    Both come from the per-variant summary the scraper keeps in the price-history
+    store, so no past snapshot is read. Returns {} when there is no store yet.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with closing(sqlite3.connect(path)) as con:
+        last_day = con.execute("SELECT max(day) FROM runs").fetchone()[0]
+        summary = {str(vid): (lowest, prev if since == last_day else None)
+                   for vid, lowest, prev, since in con.execute("SELECT variant_id, lowest, prev_price, since FROM variants")}
+    known = [summary.get(v, (None, None)) for v in cols["vid"]]
+    low = np.array([k[0] for k in known], dtype=float)
+    prev = np.array([k[1] for k in known], dtype=float)
+    with np.errstate(invalid="ignore"):
+        dropped = prev > cols["disc"]
+    return {"low": low, "prev": np.where(dropped, prev, np.nan)}
+
+SORT_KEYS = ("p", "n", "vp", "v", "c")
+
+def sort_ranks(cols):
+    """Dense rank of every row for each sortable column, keyed rank_<col>.
+
+    The page used to sort with a comparator that lower-cased strings on every
+    comparison; comparing these integers gives the same order. Equal values
+    share a rank, and the page breaks ties on each row's place in the
+    catalogue (`ix` in the shards), as the old stable sort of allData did in
+    either direction. Strings are ranked by UTF-16 code unit, as JavaScript's
+    < compares them.
+    """
+    def text_rank(values):
+        keys = np.array([str(x).lower().encode("utf-16-be") for x in values], dtype=object)
+        return np.unique(keys, return_inverse=True)[1] if len(keys) else np.zeros(0, dtype=int)
+    vp = np.where(np.isnan(cols["disc"]), np.nan_to_num(cols["orig"], nan=0.0), cols["disc"])
+    return {
+        "rank_p": text_rank(cols["pid"]),
+        "rank_n": text_rank(cols["title"]),
+        "rank_vp": np.unique(vp, return_inverse=True)[1],
+        "rank_v": np.unique(cols["pct"], return_inverse=True)[1],
+        "rank_c": text_rank(cols["category"].tolist()),
+    }
+
+def build_deals_payload(df):
+    """Build the deals records (one dict per row) and category set from the scraped CSV.
+
+    The page no longer embeds these records (see build_columnar_payload); this
+    is kept only as the reference benchmarks/bench_payload.py checks byte for
+    byte against the old iterrows() loop. It is also all that uses fmt_prices.
+    """
+    cols = deal_columns(df)
+    links = [BASE_URL + h if h else "#" for h in cols["handle"]]
+    vp = np.where(np.isnan(cols["disc"]), cols["orig"], cols["disc"])
+    vp_missing = np.isnan(vp).tolist()
+    deals_payload = [
+        {"n": t, "p": p, "l": l, "o": o, "d": d, "v": v if v else 0, "vp": 0 if missing else x, "c": c}
+        for t, p, l, o, d, v, x, missing, c in zip(
+            cols["title"], cols["pid"], links, fmt_prices(cols["orig"]), fmt_prices(cols["disc"]),
+            cols["pct"].tolist(), vp.tolist(), vp_missing, cols["category"].tolist(),
+        )
+    ]
+    return deals_payload, set(cols["category"].tolist())
+
+def compact_numbers(values):
+    """Float array -> JSON-ready list: None for NaN, ints for whole numbers."""
+    with np.errstate(invalid="ignore"):
+        whole = (np.mod(values, 1) == 0).tolist()
+    return [None if v != v else (int(v) if w else v) for v, w in zip(values.tolist(), whole)]
+
+def int_strings(values):
+    """values as ints if every one is a plain digit string that JSON numbers hold exactly, else unchanged."""
+    if all(v.isdigit() and len(v) < 16 and not v.startswith("0") for v in values):
+        return [int(v) for v in values]
+    return values
+
+def build_columnar_payload(cols, cats=None):
+    """Encode deal_columns() for the page: one array per field instead of one object per row.
+
+    Categories are dictionary-coded, links are bare handles, prices are plain
+    numbers (formatted in the browser), and titles are null wherever the
+    browser can rebuild them from an ASCII handle. decodeDeals() in the page
+    turns this back into the allData records renderPage() expects.
+
+    Shards pass the shared `cats` list, which (like the link base) then lives
+    in the manifest instead of every shard. Sort ranks from sort_ranks(), when
+    present in `cols`, go in `r`, and price_history() columns in `lo` / `pp`.
+    """
+    titles = [None if h and h.isascii() else t for t, h in zip(cols["title"], cols["handle"])]
+    payload = {}
+    if cats is None:
+        cats, codes = np.unique(cols["category"].astype(str), return_inverse=True)
+        payload = {"base": BASE_URL, "cats": cats.tolist()}
     else:
-        formatting_source = raw_handle
-        link_url = BASE_URL + raw_handle
-
-    display_title = format_title_from_handle(formatting_source)
-    orig_val = to_numeric_price(row.get("Original Price"))
-    disc_val = to_numeric_price(row.get("Discounted Price"))
-    pct_raw = row.get("Discount %")
-    
-    pct_val = 0
-    if pct_raw:
-        pct_val = to_numeric_price(pct_raw) or 0
-    elif orig_val and disc_val and orig_val > 0:
-        pct_val = ((orig_val - disc_val) / orig_val) * 100
-
-    category_raw = str(row.get("Category", "Other")).strip()
-    if not category_raw or category_raw.lower() == "nan": category_raw = "Other"
-    unique_categories.add(category_raw)
-
-    deals_payload.append({
-        "n": display_title, "p": pid, "l": link_url,
-        "o": fmt_price(orig_val), "d": fmt_price(disc_val),
-        "v": pct_val if pct_val else 0,
-        "vp": disc_val if disc_val is not None else (orig_val if orig_val is not None else 0),
-        "c": category_raw
+        index = {c: i for i, c in enumerate(cats)}
+        codes = np.array([index[c] for c in cols["category"].tolist()], dtype=int)
+    payload.update({
+        "n": titles,
+        "p": int_strings(cols["pid"]),
+        "h": cols["handle"],
+        "o": compact_numbers(cols["orig"]),
+        "d": compact_numbers(cols["disc"]),
+        "v": compact_numbers(cols["pct"]),
+        "c": codes.tolist(),
     })
+    if "low" in cols:
+        payload["lo"] = compact_numbers(cols["low"])
+        payload["pp"] = compact_numbers(cols["prev"])
+    if "rank_v" in cols:
+        payload["r"] = {k: cols["rank_" + k].tolist() for k in SORT_KEYS}
+    return payload
 
-json_data = json.dumps(deals_payload)
-sorted_categories = sorted(list(unique_categories))
-category_filters_html = generate_category_filters_html(sorted_categories)
-hotlinks_html = generate_hotlinks_html()
+def take_rows(cols, idx):
+    """The deal_columns() rows at positions `idx`."""
+    return {k: v[idx] if isinstance(v, np.ndarray) else [v[i] for i in idx] for k, v in cols.items()}
 
-# ---- TIMEZONE FIX (Implemented from template) ----
-try:
-    nz_tz = pytz.timezone('Pacific/Auckland')
-    scrape_time_str = datetime.now(nz_tz).strftime("%d/%m/%Y @ %I:%M %p")
-except Exception as e:
-    print(f"Timezone Error: {e}. Falling back to UTC.")
-    scrape_time_str = datetime.now().strftime("%d/%m/%Y @ %I:%M %p UTC")
-
-# What's New
-whats_new_content = "No updates found."
-if os.path.exists(WHATS_NEW_FILE):
+def write_if_missing(path, data):
+    if not os.path.exists(path):
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+def write_compressed(path):
+    """The .gz / .br copies of the file at path, unless they already exist.
+
+    The name has the content hash in it, so copies that exist were made from
+    this same content and an unchanged shard is never compressed again.
+    """
+    if os.path.exists(path + ".gz") and (brotli is None or os.path.exists(path + ".br")):
+        return
+    with open(path, "rb") as f:
+        body = f.read()
+    write_if_missing(path + ".gz", gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        write_if_missing(path + ".br", brotli.compress(body, quality=BROTLI_QUALITY))
+
+def write_data_file(out_dir, prefix, payload, compress=True):
+    """Write payload as out_dir/<prefix>-<content hash>.json plus .gz / .br copies; returns the name.
+
+    The hash in the name means the file can be cached forever and only
+    changes when its contents do. compress=False leaves the copies to a
+    later write_compressed().
+    """
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    name = f"{prefix}-{hashlib.sha256(body).hexdigest()[:12]}.json"
+    path = os.path.join(out_dir, name)
+    write_if_missing(path, body)
+    if compress:
+        write_compressed(path)
+    return name
+
+def delta_encode(ids):
+    ids = list(ids)
+    return [b - a for a, b in zip([0] + ids, ids)]
+
+def build_search_index(titles, haystacks, hot_terms=()):
+    """Posting lists for the page's search box, over rows numbered 0..n-1.
+
+    `w` is every distinct space-separated word of the lower-cased titles and
+    `p[k]` the (delta-encoded) rows whose title contains w[k]. A search piece
+    without spaces only ever matches inside one word, so the page finds its
+    rows by checking the ~17k words rather than building and scanning a
+    string per row. Product IDs and categories are few per row and checked
+    directly. `hot` holds the rows each hotlink term matches.
+    """
+    postings = {}
+    for i, title in enumerate(titles):
+        for word in set(title.lower().split(" ")):
+            if word:
+                postings.setdefault(word, []).append(i)
+    words = sorted(postings)
+    hot = {}
+    for term in hot_terms:
+        term = term.lower()
+        if term and term not in hot:
+            hot[term] = delta_encode([i for i, h in enumerate(haystacks) if term in h])
+    return {"w": words, "p": [delta_encode(postings[w]) for w in words], "hot": hot}
+
+DELTA_FIELDS = ("n", "p", "h", "o", "d", "v", "c", "lo", "pp")
+
+def payload_rows(payload, cats):
+    """{variant ID: row tuple} for a shard payload; equal tuples display identically."""
+    fields = {f: payload.get(f) or [None] * len(payload["id"]) for f in DELTA_FIELDS}
+    fields["c"] = [cats[k] for k in payload["c"]]
+    return dict(zip(payload["id"], zip(*(fields[f] for f in DELTA_FIELDS))))
+
+def read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def payload_positions(payload):
+    """{variant ID: catalogue position} for a shard payload."""
+    position, positions = 0, []
+    for step in payload["ix"]:
+        position += step
+        positions.append(position)
+    return dict(zip(payload["id"], positions))
+
+def manifest_rows(manifest, out_dir):
+    """(payload_rows(), payload_positions()) of a whole earlier build.
+
+    None if its shards are gone or carry no variant IDs or positions.
+    """
+    rows, positions = {}, {}
+    for shard in manifest.get("shards", []):
+        try:
+            with open(os.path.join(out_dir, shard["file"]), "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if "id" not in payload or "ix" not in payload:
+            return None
+        rows.update(payload_rows(payload, manifest["cats"]))
+        positions.update(payload_positions(payload))
+    return rows, positions
+
+def increasing_run(values):
+    """Indices of a longest strictly increasing subsequence of values."""
+    tails, tail_at, before = [], [], [None] * len(values)
+    for k, v in enumerate(values):
+        j = bisect_left(tails, v)
+        if j == len(tails):
+            tails.append(v)
+            tail_at.append(k)
+        else:
+            tails[j] = v
+            tail_at[j] = k
+        before[k] = tail_at[j - 1] if j else None
+    run, k = [], tail_at[-1] if tail_at else None
+    while k is not None:
+        run.append(k)
+        k = before[k]
+    return run[::-1]
+
+def build_delta(old, old_ix, new, new_ix):
+    """What turns the `old` payload_rows() into `new`: removed variant IDs plus every added or changed row.
+
+    `old_ix` / `new_ix` are the builds' catalogue positions. Delta rows carry
+    their new position in `ix`; the page puts them there and fills the other
+    positions with the unchanged rows in their old order (see applyDelta). So
+    unchanged rows that are no longer in that order are sent as well: all but
+    the longest run of them still in order.
+    """
+    changed = {vid for vid, row in new.items() if old.get(vid) != row}
+    kept = sorted((vid for vid in new if vid not in changed), key=new_ix.get)
+    staying = {kept[k] for k in increasing_run([old_ix[vid] for vid in kept])}
+    changed.update(vid for vid in kept if vid not in staying)
+    ordered = [vid for vid in new if vid in changed]
+    rows = {"id": ordered}
+    rows.update({f: [new[vid][k] for vid in ordered] for k, f in enumerate(DELTA_FIELDS)})
+    rows["ix"] = [new_ix[vid] for vid in ordered]
+    return {"removed": [vid for vid in old if vid not in new], "rows": rows}
+
+def write_data_shards(cols, out_dir=DATA_DIR, hot_terms=(), report=None):
+    """Split the deals into discount-band shards, plus a search index, in out_dir.
+
+    Rows are renumbered band by band, so each shard covers a contiguous run
+    of row numbers starting at its `start` and the search index can refer to
+    rows by number. Each shard's `ix` holds its rows' positions in `cols`
+    (delta-encoded), which the page sorts ties by so they keep catalogue
+    order whichever band loaded first. Shards also carry variant IDs, and
+    the build is compared with the previous one (found through
+    out_dir/manifest.json) by variant ID to write a delta file. The manifest
+    lists the last DELTA_CHAIN of them, so a browser holding an earlier build
+    can patch its copy instead of fetching every shard. Every file goes through
+    write_data_file(); with PRECOMPRESS, the .gz / .br copies are then made
+    COMPRESS_WORKERS files at a time, biggest first. Files no longer
+    referenced are removed. Returns the manifest, which is also saved for the
+    next build.
+    """
+    report = report or RunReport("site")
+    os.makedirs(out_dir, exist_ok=True)
+    previous = read_manifest(out_dir)
+    cats = sorted(set(cols["category"].tolist()))
+    pct = cols["pct"]
+    bounds = [np.inf] + DISCOUNT_BANDS
+    bands = [(f"{lo}-{hi if hi != np.inf else 100}", (pct > 0) & (pct >= lo) & (pct < hi))
+             for hi, lo in zip(bounds, bounds[1:])]
+    bands.append(("none", pct <= 0))
+
+    shards = []
+    order = []
+    rows, positions = {}, {}
+    for label, mask in bands:
+        idx = np.flatnonzero(mask)
+        if not len(idx):
+            continue
+        payload = build_columnar_payload(take_rows(cols, idx), cats)
+        payload["id"] = int_strings([cols["vid"][i] for i in idx])
+        payload["ix"] = delta_encode(idx.tolist())
+        rows.update(payload_rows(payload, cats))
+        positions.update(payload_positions(payload))
+        name = write_data_file(out_dir, f"deals-{label}", payload, compress=False)
+        band_pct = pct[idx]
+        shards.append({"file": name, "start": len(order), "rows": len(idx),
+                       "min": float(band_pct.min()), "max": float(band_pct.max())})
+        order.extend(idx.tolist())
+
+    titles = [cols["title"][i] for i in order]
+    haystacks = [f"{cols['title'][i]} {cols['pid'][i]} {cols['category'][i]}".lower() for i in order]
+    search = write_data_file(out_dir, "search", build_search_index(titles, haystacks, hot_terms), compress=False)
+
+    version = hashlib.sha256("".join(f["file"] for f in shards).encode("utf-8")).hexdigest()[:12]
+    deltas = []
+    if previous and previous.get("version") == version:
+        deltas = previous.get("deltas", [])
+    elif previous and previous.get("version"):
+        old = manifest_rows(previous, out_dir)
+        if old is not None:
+            delta = {"from": previous["version"], "to": version, **build_delta(*old, rows, positions)}
+            deltas = [{"from": previous["version"], "to": version, "file": write_data_file(out_dir, "delta", delta, compress=False)}]
+            deltas += previous.get("deltas", [])[:DELTA_CHAIN - 1]
+            print(f"Delta since the last build: {len(delta['rows']['id'])} rows changed, {len(delta['removed'])} removed")
+
+    keep = {f["file"] for f in shards} | {search} | {d["file"] for d in deltas}
+    if PRECOMPRESS:
+        paths = sorted((os.path.join(out_dir, name) for name in keep), key=os.path.getsize, reverse=True)
+        with report.phase("compress"), ThreadPoolExecutor(COMPRESS_WORKERS) as pool:
+            list(pool.map(write_compressed, paths))
+        keep = {name + ext for name in keep for ext in ("", ".gz", ".br")}
+    for name in os.listdir(out_dir):
+        if name.startswith(("deals-", "search-", "delta-")) and name not in keep:
+            os.remove(os.path.join(out_dir, name))
+
+    manifest = {"version": version, "base": BASE_URL, "cats": cats, "shards": shards, "search": search,
+                "deltas": deltas}
+    with open(os.path.join(out_dir, "manifest.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(os.path.join(out_dir, "manifest.json.tmp"), os.path.join(out_dir, "manifest.json"))
+    return {**manifest, "dir": out_dir}
+
+# Filtering and sorting for the page, run in a Web Worker so dragging the % inputs
+# or typing never stalls the UI thread. Kept out of the f-string template below
+# so its braces don't need doubling.
+ENGINE_JS = """
+// Keeps just the fields filters and sorts need, by row number, and answers each query with the
+// matching row numbers in sort order. Sorting compares the build-time ranks (see sort_ranks in
+// FinalSiteGen.py) instead of lower-casing strings inside the comparator, and breaks ties on the
+// row's catalogue position (rows.ix), so equal values come back in catalogue order in both
+// directions however the rows were loaded.
+function dealsEngine(post) {
+    const rows = { n: [], p: [], c: [], v: [], ix: [] };
+    const ranks = { p: [], n: [], vp: [], v: [], c: [] };
+    const order = [];  // row numbers in load order, i.e. the order allData had
+    let cats = [], indexUrl = null, index = null, indexLoad = null;
+
+    // Search index (see build_search_index in FinalSiteGen.py), fetched the first time someone
+    // searches. Until it arrives, or when the data is inlined, search scans every row.
+    function loadIndex() {
+        if (indexLoad || !indexUrl) return;
+        indexLoad = fetch(indexUrl).then(r => { if (!r.ok) throw new Error('HTTP ' + r.status); return r.json(); }).then(idx => {
+            const undelta = a => { const out = new Int32Array(a.length); let x = 0; for (let k = 0; k < a.length; k++) out[k] = x += a[k]; return out; };
+            idx.p = idx.p.map(undelta);
+            for (const t in idx.hot) idx.hot[t] = new Set(undelta(idx.hot[t]));
+            idx.memo = new Map();
+            index = idx;
+            post({ type: 'index' });
+        }).catch(err => { indexLoad = null; console.error('Failed to load search index', err); });
+    }
+    function titleRows(piece) {
+        let hits = index.memo.get(piece);
+        if (hits) return hits;
+        hits = new Set();
+        index.w.forEach((w, k) => { if (w.includes(piece)) for (const i of index.p[k]) hits.add(i); });
+        if (index.memo.size > 50) index.memo.clear();
+        index.memo.set(piece, hits);
+        return hits;
+    }
+    const haystack = i => (rows.n[i] + ' ' + rows.p[i] + ' ' + cats[rows.c[i]]).toLowerCase();
+    // Same result as haystack(i).includes(term): each space-free piece of the term must fall inside
+    // one word of the title, product ID or category; terms with spaces are then checked in full.
+    function matcher(term) {
+        if (!term) return null;
+        loadIndex();
+        if (!index) return i => haystack(i).includes(term);
+        const hot = index.hot[term];
+        if (hot) return i => hot.has(i);
+        const checks = term.split(' ').filter(Boolean).map(piece => {
+            const hits = titleRows(piece);
+            const catHit = cats.map(c => c.toLowerCase().includes(piece));
+            return i => hits.has(i) || catHit[rows.c[i]] || rows.p[i].includes(piece);
+        });
+        const whole = term.includes(' ');
+        return i => checks.every(ok => ok(i)) && (!whole || haystack(i).includes(term));
+    }
+    function query(q) {
+        const match = matcher(q.search.toLowerCase());
+        const catOk = q.activeCategory === 'all' ? null : cats.map(c => c.toLowerCase() === q.activeCategory);
+        const out = order.filter(i => {
+            const v = rows.v[i];
+            if (catOk && !catOk[rows.c[i]]) return false;
+            if (q.hideZero && v <= 0) return false;
+            if (v < q.minPct || v > q.maxPct) return false;
+            if (match && !match(i)) return false;
+            return true;
+        });
+        const r = ranks[q.sortCol], ix = rows.ix, dir = q.sortDir === 'asc' ? 1 : -1;
+        out.sort((a, b) => (r[a] - r[b]) * dir || ix[a] - ix[b]);
+        return Int32Array.from(out);
+    }
+    // Rows restored from IndexedDB (see loadSnapshot) come without build-time ranks; they are ranked here
+    // with the comparator the ranks stand in for. Such a message holds every row.
+    function rankRows(m) {
+        const keys = { p: m.p, n: m.n, vp: m.vp, v: m.v, c: m.c.map(k => cats[k]) }, r = {};
+        for (const col in keys) {
+            const vals = keys[col].map(x => typeof x === 'string' ? x.toLowerCase() : x);
+            const idx = vals.map((_, k) => k).sort((a, b) => vals[a] < vals[b] ? -1 : vals[a] > vals[b] ? 1 : 0);
+            r[col] = new Int32Array(vals.length);
+            let rank = 0;
+            idx.forEach((k, j) => { if (j && vals[idx[j - 1]] < vals[k]) rank++; r[col][k] = rank; });
+        }
+        return r;
+    }
+    return function handle(m) {
+        if (m.type === 'config') { cats = m.cats; indexUrl = m.indexUrl; }
+        else if (m.type === 'rows') {
+            const r = m.r || rankRows(m);
+            for (let k = 0; k < m.v.length; k++) {
+                const i = m.start + k;
+                rows.n[i] = m.n[k]; rows.p[i] = m.p[k]; rows.c[i] = m.c[k]; rows.v[i] = m.v[k];
+                rows.ix[i] = m.ix ? m.ix[k] : i;  // inlined deals come in catalogue order
+                for (const col in ranks) ranks[col][i] = r[col][k];
+                order.push(i);
+            }
+        }
+        else if (m.type === 'loadIndex') loadIndex();
+        else if (m.type === 'query') { const ids = query(m.q); post({ type: 'result', seq: m.seq, ids }, [ids.buffer]); }
+    };
+}
+// Returns a send(message) function. Falls back to running the engine on this thread
+// (replies still arrive asynchronously) where workers aren't available.
+function startEngine(onMessage) {
+    try {
+        const src = dealsEngine.toString() + '\\nconst handle = dealsEngine((m, t) => postMessage(m, t || []));\\nonmessage = e => handle(e.data);';
+        const worker = new Worker(URL.createObjectURL(new Blob([src], { type: 'text/javascript' })));
+        worker.onmessage = e => onMessage(e.data);
+        return m => worker.postMessage(m);
+    } catch (err) {
+        const handle = dealsEngine(m => setTimeout(() => onMessage(m), 0));
+        return m => handle(m);
+    }
+}
+"""
+
+# IndexedDB copy of the deals for returning visitors, patched with the delta files
+# write_data_shards() lists in the manifest. Plain string for the same reason as ENGINE_JS.
+SNAPSHOT_JS = """
+// A stored snapshot is {version, cols}: cols is a shard payload (see build_columnar_payload in FinalSiteGen.py)
+// holding every row of that build, with variant IDs in cols.id and catalogue positions, decoded, in cols.ix.
+// snapshotStore(key) reads it, snapshotStore(key, x) replaces it. The key is the store's product URL base, so sites
+// for different stores on one origin keep their own.
+const SNAPSHOT_FIELDS = ['id', 'ix', 'n', 'p', 'h', 'o', 'd', 'v', 'c', 'lo', 'pp'];
+function snapshotStore(key, value) {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open('jb-deals', 1);
+        open.onupgradeneeded = () => open.result.createObjectStore('snapshot');
+        open.onerror = () => reject(open.error);
+        open.onsuccess = () => {
+            const db = open.result;
+            const tx = db.transaction('snapshot', value === undefined ? 'readonly' : 'readwrite');
+            const req = value === undefined ? tx.objectStore('snapshot').get(key) : tx.objectStore('snapshot').put(value, key);
+            tx.oncomplete = () => { db.close(); resolve(req.result); };
+            tx.onerror = tx.onabort = () => { db.close(); reject(tx.error); };
+        };
+    });
+}
+// Shard payloads, in manifest order, joined into one.
+function mergeShards(parts, manifest) {
+    const cols = { base: manifest.base, cats: manifest.cats.slice() };
+    for (const f of SNAPSHOT_FIELDS) cols[f] = [].concat(...parts.map(part => part[f] || part.id.map(() => null)));
+    return cols;
+}
+// One delta file (see build_delta in FinalSiteGen.py), applied in place: removed and changed rows are dropped,
+// the new versions go to the catalogue positions the delta gives them, and the rows left fill the other positions
+// in their old order. That is the new build's catalogue order, so the cols end up in it, with ix renumbered to match.
+// Delta rows name their category, which may be new.
+function applyDelta(cols, delta) {
+    const rows = delta.rows, drop = new Set(delta.removed.concat(rows.id)), keep = [];
+    cols.id.forEach((id, k) => { if (!drop.has(id)) keep.push(k); });
+    keep.sort((a, b) => cols.ix[a] - cols.ix[b]);
+    // from[position]: a kept row's index in cols, or -1 - j for delta row j
+    const from = new Array(keep.length + rows.id.length).fill(null);
+    rows.ix.forEach((x, j) => { if (from[x] !== null) throw new Error('Delta does not fit the stored deals'); from[x] = -1 - j; });
+    let next = 0;
+    for (let x = 0; x < from.length; x++) if (from[x] === null) from[x] = keep[next++];
+    const codes = new Map(cols.cats.map((c, k) => [c, k]));
+    const code = c => { if (!codes.has(c)) { codes.set(c, cols.cats.length); cols.cats.push(c); } return codes.get(c); };
+    const fresh = { ...rows, c: rows.c.map(code) };
+    for (const f of SNAPSHOT_FIELDS) cols[f] = from.map(k => k < 0 ? fresh[f][-1 - k] : cols[f][k]);
+    cols.ix = from.map((_, x) => x);
+}
+"""
+
+# ---- Main Processing ----
+def build_site(cols, report=None):
+    """Write OUT_HTML, and the DATA_DIR files it loads, for deal_columns() output.
+
+    Each step is timed as a phase of `report` when one is given.
+    """
+    report = report or RunReport("site")
+    print(f"Processing {len(cols['pid'])} rows...")
+    report.data["rows"] = len(cols["pid"])
+    with report.phase("price history"):
+        cols.update(price_history(cols))
+    with report.phase("sort ranks"):
+        cols.update(sort_ranks(cols))
+    unique_categories = set(cols["category"].tolist())
+
+    hotlinks = read_hotlinks()
+    with report.phase("data files"):
+        if DATA_DIR:
+            data_dir = os.path.join(os.path.dirname(OUT_HTML), DATA_DIR)
+            manifest = write_data_shards(cols, data_dir, [term for _, term in hotlinks], report)
+            manifest["dir"] = DATA_DIR
+            print(f"Wrote {len(manifest['shards'])} data shards to {DATA_DIR}/")
+            data_js = f"const dataManifest = {json.dumps(manifest)};\nconst inlineDeals = null;"
+            report.data["data_bytes"] = sum(os.path.getsize(os.path.join(data_dir, name))
+                                            for name in os.listdir(data_dir))
+        else:
+            json_data = json.dumps(build_columnar_payload(cols), separators=(",", ":"), ensure_ascii=False)
+            data_js = f"const dataManifest = null;\nconst inlineDeals = {json_data};"
+    data_js = data_js.replace("</", "<\\/")
+    html_started = time.perf_counter()
+    sorted_categories = sorted(list(unique_categories))
+    category_filters_html = generate_category_filters_html(sorted_categories)
+    hotlinks_html = generate_hotlinks_html(hotlinks)
+
+    # ---- TIMEZONE FIX (Implemented from template) ----
     try:
-        with open(WHATS_NEW_FILE, "r", encoding="utf-8") as f:
-            whats_new_content = f.read().replace("\n", "<br>")
-    except Exception: pass
+        store_tz = pytz.timezone(TIMEZONE)
+        scrape_time_str = datetime.now(store_tz).strftime("%d/%m/%Y @ %I:%M %p")
+    except Exception as e:
+        print(f"Timezone Error: {e}. Falling back to UTC.")
+        scrape_time_str = datetime.now().strftime("%d/%m/%Y @ %I:%M %p UTC")
 
-# ---- HTML Output ----
-html_content = f"""<!doctype html>
+    # What's New
+    whats_new_content = "No updates found."
+    if os.path.exists(WHATS_NEW_FILE):
+        try:
+            with open(WHATS_NEW_FILE, "r", encoding="utf-8") as f:
+                whats_new_content = f.read().replace("\n", "<br>")
+        except Exception: pass
+
+    # ---- HTML Output ----
+    html_content = f"""<!doctype html>
 <html lang="en">
 <head>
 <meta charset="utf-8"/>
@@ -214,8 +902,20 @@ html_content = f"""<!doctype html>
   .price {{ font-family: monospace; font-size: 14px; color: var(--text); white-space: nowrap; }}
   .discount {{ color: #D32F2F; font-weight: 700; white-space: nowrap; }}
   :root.dark .discount {{ color: #FF5252; }}
+  .price-note {{ font-size: 11px; font-weight: normal; color: var(--muted); }}
+  .price-note.drop {{ color: #2E7D32; }} :root.dark .price-note.drop {{ color: #66BB6A; }}
+  .table-container.virtual .price-note {{ display: inline; margin-left: 6px; }}
   .google-icon {{ width: 20px; height: 20px; fill: var(--muted); vertical-align: middle; }}
   tr:hover .google-icon {{ fill: var(--accent); }}
+  .table-container.virtual {{ max-height: 75vh; overflow-y: auto; }}
+  .table-container.virtual thead th {{ position: sticky; top: 0; z-index: 1; }}
+  .table-container.virtual tbody td {{ white-space: nowrap; }}
+  .table-container.virtual tbody td:nth-child(2) {{ max-width: 0; width: 45%; }}
+  .table-container.virtual a.product-link {{ overflow: hidden; text-overflow: ellipsis; }}
+  .table-container.virtual tbody tr:nth-child(even) {{ background: none; }}
+  .table-container.virtual tbody tr.even {{ background: var(--row-even); }}
+  .table-container.virtual tbody tr:hover {{ background: var(--row-hover); }}
+  .table-container.virtual tbody tr.spacer td {{ padding: 0; border: 0; }}
   a.product-link {{ color: var(--text); text-decoration: none; font-weight: 600; display: block; }}
   a.product-link:hover {{ color: var(--accent); text-decoration: underline; }}
   .pagination-bar {{ display: flex; justify-content: space-between; align-items: center; padding: 12px; background: var(--header-bg); border: 1px solid var(--border); border-radius: 8px; color: var(--muted); font-size: 14px; }}
@@ -236,6 +936,7 @@ html_content = f"""<!doctype html>
 </style>
 </head>
 <body>
+<svg width="0" height="0" style="position:absolute"><symbol id="google-icon" viewBox="0 0 24 24"><path d="M12.48 10.92v3.28h7.84c-.24 1.84-.853 3.187-1.787 4.133-1.147 1.147-2.933 2.4-6.053 2.4-4.827 0-8.6-3.893-8.6-8.72s3.773-8.72 8.6-8.72c2.6 0 4.507 1.027 5.907 2.347l2.307-2.307C18.747 1.44 16.133 0 12.48 0 5.867 0 .533 5.333.533 12S5.867 24 12.48 24c3.44 0 6.04-1.133 8.147-3.333 2.147-2.147 2.813-5.013 2.813-7.387 0-.747-.053-1.44-.16-2.107H12.48z"/></symbol></svg>
 <div class="container">
   <header>
     <div class="header-top">
@@ -284,7 +985,7 @@ html_content = f"""<!doctype html>
     </table>
   </div>
   <div class="pagination-bar">
-    <div>Rows: <select id="rowsPerPage"><option value="50">50</option><option value="100" selected>100</option><option value="200">200</option><option value="1000">All</option></select></div>
+    <div>Rows: <select id="rowsPerPage"><option value="50">50</option><option value="100" selected>100</option><option value="200">200</option><option value="0">All</option></select></div>
     <div id="pageInfo">Page 1</div>
     <div style="display:flex; gap:5px;"><button class="btn secondary" id="btnPrev">Prev</button><button class="btn secondary" id="btnNext">Next</button></div>
   </div>
@@ -296,54 +997,204 @@ html_content = f"""<!doctype html>
   </div>
 </div>
 <script>
-const allData = {json_data};
-const googleIconSvg = '<svg class="google-icon" viewBox="0 0 24 24"><path d="M12.48 10.92v3.28h7.84c-.24 1.84-.853 3.187-1.787 4.133-1.147 1.147-2.933 2.4-6.053 2.4-4.827 0-8.6-3.893-8.6-8.72s3.773-8.72 8.6-8.72c2.6 0 4.507 1.027 5.907 2.347l2.307-2.307C18.747 1.44 16.133 0 12.48 0 5.867 0 .533 5.333.533 12S5.867 24 12.48 24c3.44 0 6.04-1.133 8.147-3.333 2.147-2.147 2.813-5.013 2.813-7.387 0-.747-.053-1.44-.16-2.107H12.48z"/></svg>';
+function decodeDeals(cols, start = 0) {{
+    const money = new Intl.NumberFormat('en-US', {{ minimumFractionDigits: 2, maximumFractionDigits: 2 }});
+    const fmt = x => x === null ? '' : '$' + money.format(x);
+    const fixes = {json.dumps(TITLE_FIXES)};
+    const titleFromHandle = h => fixes.reduce((t, [a, b]) => t.split(a).join(b), h.replace(/-/g, ' ').replace(/[A-Za-z]+/g, w => w[0].toUpperCase() + w.slice(1).toLowerCase()));
+    // Price-history note (see price_history in FinalSiteGen.py): what it cost in the previous run if it has dropped since,
+    // otherwise its lowest-ever price if that was lower.
+    const note = (price, lo, pp) => pp !== null ? (lo !== null && price <= lo ? 'Lowest ever, ' : '') + 'was ' + fmt(pp) : (lo !== null && price > lo ? 'Low ' + fmt(lo) : '');
+    const out = new Array(cols.h.length);
+    for (let i = 0; i < out.length; i++) {{
+        const h = cols.h[i], o = cols.o[i], d = cols.d[i];
+        const pp = cols.pp ? cols.pp[i] : null;
+        out[i] = {{ n: cols.n[i] !== null ? cols.n[i] : titleFromHandle(h), p: String(cols.p[i]), l: h ? cols.base + h : '#', o: fmt(o), d: fmt(d), v: cols.v[i], vp: d !== null ? d : (o !== null ? o : 0), c: cols.cats[cols.c[i]], i: start + i,
+                    ph: note(d !== null ? d : o, cols.lo ? cols.lo[i] : null, pp), pd: pp !== null }};
+    }}
+    return out;
+}}
+{data_js}
+const googleIconSvg = '<svg class="google-icon"><use href="#google-icon"/></svg>';
 let state = {{ filtered: [], currentPage: 1, rowsPerPage: 100, sortCol: 'v', sortDir: 'desc', search: '', minPct: 0, maxPct: 100, activeCategory: 'all', hideZero: true }};
 const tbody = document.getElementById('tableBody');
 const countEl = document.getElementById('visibleCount');
-function init() {{ state.filtered = [...allData]; applyFilters(); setupListeners(); renderPage(); }}
-function escapeHtml(text) {{ if (!text) return ''; return text.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;").replace(/"/g, "&quot;").replace(/'/g, "&#039;"); }}
-function renderPage() {{
-    const start = (state.currentPage - 1) * state.rowsPerPage; const end = start + state.rowsPerPage; const slice = state.filtered.slice(start, end); let html = '';
-    slice.forEach(d => {{
-        const googleLink = `https://www.google.com/search?q=${{encodeURIComponent(d.n)}}`;
-        let linkHtml = `<span class="product-link">${{escapeHtml(d.n)}}</span>`;
-        if (d.l && d.l !== '#') {{ linkHtml = `<a class="product-link" href="${{d.l}}" target="_blank">${{escapeHtml(d.n)}}</a>`; }}
-        let pctDisplay = d.v > 0 ? `${{Math.round(d.v)}}%` : '';
-        html += `<tr><td style="font-family:monospace; color:var(--muted);">${{escapeHtml(d.p)}}</td><td>${{linkHtml}}</td><td class="price" style="text-decoration:line-through; color:var(--muted);">${{d.o}}</td><td class="price" style="font-weight:bold;">${{d.d}}</td><td class="discount">${{pctDisplay}}</td><td><span style="background:var(--row-hover); padding:2px 8px; border-radius:4px; font-size:12px;">${{escapeHtml(d.c)}}</span></td><td style="text-align:center;"><a href="${{googleLink}}" target="_blank">${{googleIconSvg}}</a></td></tr>`;
+{ENGINE_JS}
+const sendToEngine = startEngine(onEngineMessage);
+let allData = [];
+const byId = [];
+let querySeq = 0, resetPageOnResult = false;
+{SNAPSHOT_JS}
+// Where the deals come from: 'inline', 'snapshot' (the IndexedDB copy, see loadSnapshot) or 'shards'.
+let dealSource = inlineDeals ? 'inline' : null;
+// Shard fetches plus, at start-up, the look for a stored snapshot; renderPage() shows 'Loading deals…' meanwhile.
+let pendingLoads = inlineDeals ? 0 : 1;
+const canSnapshot = !!(dataManifest && dataManifest.version && window.indexedDB);
+let snapshotSaved = false, fetchedRest = false;
+function init() {{
+    if (inlineDeals) {{ configEngine(inlineDeals.cats, false); addDeals(inlineDeals, 0); }}
+    else loadSnapshot().then(cols => {{
+        if (cols) {{ dealSource = 'snapshot'; configEngine(cols.cats, false); addDeals(cols, 0); }}
+        else {{ dealSource = 'shards'; configEngine(dataManifest.cats, true); ensureShards(); }}
+        pendingLoads--;
+        runQuery(false);
     }});
-    if (slice.length === 0) {{ html = '<tr><td colspan="7" style="text-align:center; padding:20px;">No deals found matching filters.</td></tr>'; }}
-    tbody.innerHTML = html;
-    const total = state.filtered.length; const maxPage = Math.ceil(total / state.rowsPerPage) || 1;
-    document.getElementById('pageInfo').innerText = `Page ${{state.currentPage}} of ${{maxPage}}`;
-    document.getElementById('btnPrev').disabled = state.currentPage === 1; document.getElementById('btnNext').disabled = state.currentPage >= maxPage; countEl.innerText = total;
+    applyFilters(); setupListeners(); renderPage();
+}}
+// The search index numbers rows as the shards do, so it only applies to deals loaded from them.
+function configEngine(cats, useIndex) {{
+    sendToEngine({{ type: 'config', cats, indexUrl: useIndex ? new URL(dataManifest.dir + '/' + dataManifest.search, location.href).href : null }});
+}}
+function addDeals(cols, start) {{
+    const deals = decodeDeals(cols, start);
+    for (const d of deals) {{ allData.push(d); byId[d.i] = d; }}
+    sendToEngine({{ type: 'rows', start, n: deals.map(d => d.n), p: deals.map(d => d.p), c: cols.c, v: cols.v, ix: cols.ix, r: cols.r, vp: cols.r ? null : deals.map(d => d.vp) }});
+}}
+const fetchJson = url => fetch(url).then(r => {{ if (!r.ok) throw new Error('HTTP ' + r.status); return r.json(); }});
+// Returning visitors keep every deal in IndexedDB and bring it up to date with the delta files since their visit,
+// a few KB each. With no stored copy, or one older than the manifest's delta chain, this gives null and the shards load.
+async function loadSnapshot() {{
+    if (!canSnapshot) return null;
+    try {{
+        const saved = await snapshotStore(dataManifest.base);
+        if (!saved || !saved.cols.ix) return null;  // stored before rows carried their catalogue position
+        const chain = [];
+        for (let version = saved.version; version !== dataManifest.version; ) {{
+            const step = dataManifest.deltas.find(d => d.from === version);
+            if (!step || chain.length === dataManifest.deltas.length) return null;
+            chain.push(step); version = step.to;
+        }}
+        for (const step of chain) applyDelta(saved.cols, await fetchJson(dataManifest.dir + '/' + step.file));
+        if (chain.length) {{
+            saved.version = dataManifest.version;
+            snapshotStore(dataManifest.base, saved).catch(err => console.error('Could not store deals for next visit', err));
+        }}
+        snapshotSaved = true;
+        saved.cols.base = dataManifest.base;
+        return saved.cols;
+    }} catch (err) {{
+        console.error('Stored deals unusable, loading them afresh', err);
+        return null;
+    }}
+}}
+// After a shard-loaded first view, fetch whatever the filters skipped and store the lot for the next visit.
+function completeSnapshot() {{
+    if (!canSnapshot || snapshotSaved || pendingLoads) return;
+    if (dataManifest.shards.some(s => !shardData[s.file])) {{
+        if (!fetchedRest) {{ fetchedRest = true; ensureShards(true); }}
+        return;
+    }}
+    snapshotSaved = true;
+    const cols = mergeShards(dataManifest.shards.map(s => shardData[s.file]), dataManifest);
+    snapshotStore(dataManifest.base, {{ version: dataManifest.version, cols }}).catch(err => console.error('Could not store deals for next visit', err));
 }}
-function applyFilters() {{
-    const term = state.search.toLowerCase();
-    state.filtered = allData.filter(d => {{
-        if (state.activeCategory !== 'all' && (!d.c || d.c.toLowerCase() !== state.activeCategory)) return false;
-        if (state.hideZero && d.v <= 0) return false;
-        if (d.v < state.minPct || d.v > state.maxPct) return false;
-        if (term && !(d.n + ' ' + d.p + ' ' + d.c).toLowerCase().includes(term)) return false;
-        return true;
+// Filtering and sorting happen in the engine; the newest answer replaces state.filtered.
+function runQuery(resetPage) {{
+    if (resetPage) resetPageOnResult = true;
+    const q = {{ search: state.search, activeCategory: state.activeCategory, hideZero: state.hideZero, minPct: state.minPct, maxPct: state.maxPct, sortCol: state.sortCol, sortDir: state.sortDir }};
+    sendToEngine({{ type: 'query', seq: ++querySeq, q }});
+}}
+function onEngineMessage(m) {{
+    if (m.type === 'index') {{ if (state.search) runQuery(false); return; }}
+    if (m.type !== 'result' || m.seq !== querySeq) return;
+    state.filtered = Array.from(m.ids, i => byId[i]);
+    if (resetPageOnResult) {{ state.currentPage = 1; scroller.scrollTop = 0; resetPageOnResult = false; }}
+    state.currentPage = Math.min(state.currentPage, pageCount());
+    renderPage();
+}}
+// Shards are fetched in parallel but merged in manifest order (biggest discounts first), re-filtering after each,
+// so the default view can render as soon as the top band lands. Shards no filter can match are only fetched
+// afterwards, by completeSnapshot(), and only where the deals can be kept in IndexedDB.
+const shardLoads = {{}};
+const shardData = {{}};
+let shardChain = Promise.resolve();
+function ensureShards(all) {{
+    if (dealSource !== 'shards') return;
+    dataManifest.shards.forEach(s => {{
+        if (shardLoads[s.file] || (!all && (s.max < state.minPct || s.min > state.maxPct || (state.hideZero && s.max <= 0)))) return;
+        pendingLoads++;
+        const req = fetchJson(dataManifest.dir + '/' + s.file);
+        shardLoads[s.file] = req;
+        shardChain = shardChain.then(() => req).then(cols => {{
+            cols.base = dataManifest.base; cols.cats = dataManifest.cats;
+            let x = 0; cols.ix = cols.ix.map(d => x += d);
+            addDeals(cols, s.start);
+            shardData[s.file] = cols;
+        }}).catch(err => {{ delete shardLoads[s.file]; console.error('Failed to load ' + s.file, err); }}).finally(() => {{
+            pendingLoads--;
+            runQuery(false);
+            if (!pendingLoads) setTimeout(completeSnapshot, 1000);
+        }});
     }});
-    state.currentPage = 1; sortData();
 }}
-function sortData() {{
-    const col = state.sortCol; const dir = state.sortDir === 'asc' ? 1 : -1;
-    state.filtered.sort((a, b) => {{
-        let valA = a[col]; let valB = b[col];
-        if (typeof valA === 'string') valA = valA.toLowerCase(); if (typeof valB === 'string') valB = valB.toLowerCase();
-        if (col === 'vp') {{ valA = a.vp; valB = b.vp; }}
-        if (valA < valB) return -1 * dir; if (valA > valB) return 1 * dir; return 0;
+function escapeHtml(text) {{ if (!text) return ''; return text.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;").replace(/"/g, "&quot;").replace(/'/g, "&#039;"); }}
+// Rows per page of 0 means "All": the table then scrolls on its own and only the rows in view, plus a buffer,
+// exist in the DOM. A fixed pool of <tr>s between two spacer rows is refilled in place as it scrolls.
+const scroller = document.querySelector('.table-container');
+const virtual = {{ pool: [], top: null, bottom: null, rowHeight: 49, buffer: 10, frame: 0 }};
+const rowCells = `<td style="font-family:monospace; color:var(--muted);"></td><td><a class="product-link" target="_blank"></a></td><td class="price" style="text-decoration:line-through; color:var(--muted);"></td><td class="price" style="font-weight:bold;"></td><td class="discount"></td><td><span style="background:var(--row-hover); padding:2px 8px; border-radius:4px; font-size:12px;"></span></td><td style="text-align:center;"><a target="_blank">${{googleIconSvg}}</a></td>`;
+function priceNote(d) {{ return d.ph ? `<div class="price-note${{d.pd ? ' drop' : ''}}">${{d.ph}}</div>` : ''; }}
+function pageCount() {{ return state.rowsPerPage ? Math.ceil(state.filtered.length / state.rowsPerPage) || 1 : 1; }}
+function fillRow(tr, d, i) {{
+    const c = tr.cells;
+    tr.className = i % 2 ? 'even' : '';
+    c[0].textContent = d.p;
+    const link = c[1].firstChild; link.textContent = d.n; link.title = d.n;
+    if (d.l && d.l !== '#') link.href = d.l; else link.removeAttribute('href');
+    c[2].textContent = d.o; c[3].innerHTML = d.d + priceNote(d); c[4].textContent = d.v > 0 ? `${{Math.round(d.v)}}%` : '';
+    c[5].firstChild.textContent = d.c;
+    c[6].firstChild.href = `https://www.google.com/search?q=${{encodeURIComponent(d.n)}}`;
+}}
+function renderWindow() {{
+    if (!virtual.top) {{
+        tbody.innerHTML = '<tr class="spacer"><td colspan="7"></td></tr><tr class="spacer"><td colspan="7"></td></tr>';
+        virtual.top = tbody.firstChild; virtual.bottom = tbody.lastChild; virtual.pool = [];
+    }}
+    const total = state.filtered.length, h = virtual.rowHeight;
+    const first = Math.min(Math.max(0, Math.floor(scroller.scrollTop / h) - virtual.buffer), total);
+    const count = Math.min(total - first, Math.ceil(scroller.clientHeight / h) + 2 * virtual.buffer);
+    while (virtual.pool.length < count) {{
+        const tr = document.createElement('tr'); tr.innerHTML = rowCells;
+        tbody.insertBefore(tr, virtual.bottom); virtual.pool.push(tr);
+    }}
+    virtual.pool.forEach((tr, k) => {{
+        if (k < count) {{ fillRow(tr, state.filtered[first + k], first + k); tr.style.display = ''; }} else tr.style.display = 'none';
     }});
-    renderPage();
+    virtual.top.style.height = first * h + 'px';
+    virtual.bottom.style.height = (total - first - count) * h + 'px';
+    const measured = count && virtual.pool[0].offsetHeight;
+    if (measured && measured !== h) {{ virtual.rowHeight = measured; renderWindow(); }}
 }}
+function renderPage() {{
+    const total = state.filtered.length; const windowed = !state.rowsPerPage && total > 0;
+    scroller.classList.toggle('virtual', windowed);
+    if (windowed) renderWindow();
+    else {{
+        virtual.top = null;
+        const start = (state.currentPage - 1) * state.rowsPerPage; const end = start + state.rowsPerPage; const slice = state.filtered.slice(start, end); let html = '';
+        slice.forEach(d => {{
+            const googleLink = `https://www.google.com/search?q=${{encodeURIComponent(d.n)}}`;
+            let linkHtml = `<span class="product-link">${{escapeHtml(d.n)}}</span>`;
+            if (d.l && d.l !== '#') {{ linkHtml = `<a class="product-link" href="${{d.l}}" target="_blank">${{escapeHtml(d.n)}}</a>`; }}
+            let pctDisplay = d.v > 0 ? `${{Math.round(d.v)}}%` : '';
+            html += `<tr><td style="font-family:monospace; color:var(--muted);">${{escapeHtml(d.p)}}</td><td>${{linkHtml}}</td><td class="price" style="text-decoration:line-through; color:var(--muted);">${{d.o}}</td><td class="price" style="font-weight:bold;">${{d.d}}${{priceNote(d)}}</td><td class="discount">${{pctDisplay}}</td><td><span style="background:var(--row-hover); padding:2px 8px; border-radius:4px; font-size:12px;">${{escapeHtml(d.c)}}</span></td><td style="text-align:center;"><a href="${{googleLink}}" target="_blank">${{googleIconSvg}}</a></td></tr>`;
+        }});
+        if (slice.length === 0) {{ html = `<tr><td colspan="7" style="text-align:center; padding:20px;">${{pendingLoads > 0 ? 'Loading deals…' : 'No deals found matching filters.'}}</td></tr>`; }}
+        tbody.innerHTML = html;
+    }}
+    const maxPage = pageCount();
+    document.getElementById('pageInfo').innerText = `Page ${{state.currentPage}} of ${{maxPage}}`;
+    document.getElementById('btnPrev').disabled = state.currentPage === 1; document.getElementById('btnNext').disabled = state.currentPage >= maxPage; countEl.innerText = total;
+}}
+function loadSearchIndex() {{ sendToEngine({{ type: 'loadIndex' }}); }}
+function applyFilters() {{ ensureShards(); runQuery(true); }}
+function sortData() {{ runQuery(false); }}
 window.runHotlink = function(term) {{ document.getElementById('searchInput').value = term; state.search = term; applyFilters(); renderPage(); }}
 function setupListeners() {{
     const debounce = (fn, delay) => {{ let t; return (...args) => {{ clearTimeout(t); t = setTimeout(()=>fn(...args), delay); }}; }};
     const runFilter = debounce(() => {{ applyFilters(); renderPage(); }}, 200);
     document.getElementById('searchInput').addEventListener('input', e => {{ state.search = e.target.value; runFilter(); }});
+    document.getElementById('searchInput').addEventListener('focus', loadSearchIndex);
     document.getElementById('minPct').addEventListener('input', e => {{ state.minPct = parseFloat(e.target.value) || 0; runFilter(); }});
     document.getElementById('maxPct').addEventListener('input', e => {{ state.maxPct = parseFloat(e.target.value) || 100; runFilter(); }});
     document.getElementById('hideZero').addEventListener('change', e => {{ state.hideZero = e.target.checked; applyFilters(); renderPage(); }});
@@ -352,9 +1203,11 @@ function setupListeners() {{
     }});
     document.getElementById('resetBtn').addEventListener('click', () => {{ state.search = ''; state.minPct = 0; state.maxPct = 100; state.activeCategory = 'all'; state.hideZero = true; document.getElementById('searchInput').value = ''; document.getElementById('minPct').value = 0; document.getElementById('maxPct').value = 100; document.getElementById('hideZero').checked = true; document.querySelectorAll('.cat-filter-btn').forEach(b => b.classList.remove('active')); document.querySelector('[data-cat="all"]').classList.add('active'); applyFilters(); renderPage(); }});
     document.querySelectorAll('th[data-sort]').forEach(th => {{ th.addEventListener('click', () => {{ const col = th.dataset.sort; if (state.sortCol === col) {{ state.sortDir = state.sortDir === 'asc' ? 'desc' : 'asc'; }} else {{ state.sortCol = col; state.sortDir = 'desc'; }} sortData(); }}); }});
-    document.getElementById('rowsPerPage').addEventListener('change', e => {{ state.rowsPerPage = parseInt(e.target.value); state.currentPage = 1; renderPage(); }});
+    document.getElementById('rowsPerPage').addEventListener('change', e => {{ state.rowsPerPage = parseInt(e.target.value); state.currentPage = 1; scroller.scrollTop = 0; renderPage(); }});
+    scroller.addEventListener('scroll', () => {{ if (virtual.top && !virtual.frame) virtual.frame = requestAnimationFrame(() => {{ virtual.frame = 0; renderWindow(); }}); }}, {{ passive: true }});
+    window.addEventListener('resize', () => {{ if (virtual.top) renderWindow(); }});
     document.getElementById('btnPrev').addEventListener('click', () => {{ if(state.currentPage > 1) {{ state.currentPage--; renderPage(); }} }});
-    document.getElementById('btnNext').addEventListener('click', () => {{ const max = Math.ceil(state.filtered.length / state.rowsPerPage); if(state.currentPage < max) {{ state.currentPage++; renderPage(); }} }});
+    document.getElementById('btnNext').addEventListener('click', () => {{ if(state.currentPage < pageCount()) {{ state.currentPage++; renderPage(); }} }});
     const toggleTheme = document.getElementById('toggleThemeBtn');
     function updateThemeIcon(isDark) {{ toggleTheme.textContent = isDark ? '🌙' : '☀️'; }}
     toggleTheme.addEventListener('click', () => {{ const isDark = document.documentElement.classList.toggle('dark'); localStorage.setItem('theme', isDark ? 'dark' : 'light'); updateThemeIcon(isDark); }});
@@ -370,7 +1223,26 @@ init();
 </html>
 """
 
-with open(OUT_HTML, "w", encoding="utf-8") as f:
-    f.write(html_content)
+    with open(OUT_HTML, "w", encoding="utf-8") as f:
+        f.write(html_content)
+    report.add_time("html", time.perf_counter() - html_started)
+    report.data["index_html_bytes"] = os.path.getsize(OUT_HTML)
+
+    print(f"✅ Generated {OUT_HTML} successfully.")
+
+def main(profile=None):
+    """Build the site from the scraped files, writing a run report to SITE_REPORT.
+
+    profile ("cprofile" / "tracemalloc", or the JB_PROFILE environment
+    variable) adds a profile of the build to the report.
+    """
+    with RunReport("site", SITE_REPORT, profile) as report:
+        with report.phase("read"):
+            df = read_deals()
+        with report.phase("format"):
+            cols = deal_columns(df)
+        report.data["format_rows_per_sec"] = round(len(df) / report.seconds("format"), 1) if len(df) else None
+        build_site(cols, report)
 
-print(f"✅ Generated {OUT_HTML} successfully.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""Answer deal queries over HTTP from an in-memory index of the catalogue.
+
+An optional alternative to shipping every deal to the browser: the catalogue
+is loaded once with FinalSiteGen's own code (read_deals, deal_columns,
+price_history, sort_ranks) and kept as NumPy columns with indexes by category,
+discount and title word, and each request gets back one page of results.
+
+    GET /deals?search=&category=all&minPct=0&maxPct=100&hideZero=1&sort=v&dir=desc&page=1&perPage=100
+        -> {"total": rows matching, "page": 1, "pages": ..., "rows": [{"n", "p", "id", "l", "o", "d", "v", "vp",
+            "c", "lo", "pp"}, ...]}
+    GET /categories
+        -> {"categories": [{"name": ..., "rows": ...}, ...], "rows": catalogue size}
+
+Parameters and results follow the page's applyFilters() / sortData() (the
+dealsEngine in FinalSiteGen.py): search matches a case-insensitive substring
+of "title product-ID category", category compares lower-cased, hideZero drops
+rows at 0% or less, minPct / maxPct are inclusive, and sorting uses the same
+build-time ranks with ties kept in catalogue order in both directions.
+
+    python QueryServer.py --port 8000       # serve the catalogue in the working directory
+"""
+import argparse
+import json
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import FinalSiteGen
+
+MAX_PER_PAGE = 1000
+PIECE_CACHE = 512  # search pieces whose matching rows are kept, most recently used first
+SCAN_CHUNK = 4096  # rows of a presorted order checked per step when most rows match
+FEW_WORDS = 64  # matching title words whose rows are gathered one slice each; more are gathered in one pass
+EXPLICIT_SHARE = 8  # sort the candidates directly when at most 1/EXPLICIT_SHARE of the rows match
+
+
+class DealIndex:
+    """The catalogue as columns plus the indexes query() needs.
+
+    `cols` is deal_columns() output with price_history() and sort_ranks()
+    columns added, as build_site() has them.
+    """
+
+    def __init__(self, cols):
+        self.cols = cols
+        self.size = n = len(cols["pid"])
+        self.rows = np.arange(n, dtype=np.int64)
+        self.pct = np.asarray(cols["pct"], dtype=float)
+        self.cats, self.codes = np.unique(np.asarray(cols["category"], dtype=str), return_inverse=True)
+        self.cats = self.cats.tolist()
+        self.cat_lower = [c.lower() for c in self.cats]
+
+        # Discount index: per category (and None for every row), rows sorted by % off
+        self.by_pct = {}
+        for code in [None] + list(range(len(self.cats))):
+            rows = self.rows if code is None else np.flatnonzero(self.codes == code)
+            order = rows[np.argsort(self.pct[rows], kind="stable")]
+            self.by_pct[code] = (order, self.pct[order])
+
+        self.ranks = {k: np.asarray(cols["rank_" + k], dtype=np.int64) for k in FinalSiteGen.SORT_KEYS}
+        self.orders = {}  # (sort, direction) -> every row in that order, built on first use
+
+        # Title words: every distinct lower-cased word, split on spaces as the page's haystack is, with the
+        # rows it appears in. The words sit in one NUL-separated UTF-8 string; a piece (which has no NUL)
+        # found in it lies inside one word.
+        word_ids, flat_rows, flat_words = {}, [], []
+        for i, title in enumerate(cols["title"]):
+            for word in set(title.lower().split(" ")):
+                if word:
+                    flat_rows.append(i)
+                    flat_words.append(word_ids.setdefault(word, len(word_ids)))
+        flat_words = np.array(flat_words, dtype=np.int32)
+        self.postings = np.array(flat_rows, dtype=np.int32)[np.argsort(flat_words, kind="stable")]
+        self.posting_counts = np.bincount(flat_words, minlength=len(word_ids))
+        self.posting_starts = np.concatenate([[0], np.cumsum(self.posting_counts)])
+        self.word_bytes = "\0".join(word_ids).encode("utf-8") + b"\0"
+        self.word_starts = np.cumsum([0] + [len(w.encode("utf-8")) + 1 for w in word_ids])[:-1]
+        # Product IDs as a fixed-width byte matrix, one column per character position, for substring tests
+        # over every row at once
+        pids = [str(p).lower().encode("utf-8") for p in cols["pid"]]
+        width = max(map(len, pids), default=0)
+        self.pid_columns = np.asfortranarray(np.array(pids, dtype=f"S{max(width, 1)}").view(np.uint8).reshape(n, -1))
+        self.pid_bytes = set(b"".join(pids))
+        self.piece_cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_files(cls):
+        """The index for the files FinalSiteGen.main() would build the site from."""
+        cols = FinalSiteGen.deal_columns(FinalSiteGen.read_deals())
+        cols.update(FinalSiteGen.price_history(cols))
+        cols.update(FinalSiteGen.sort_ranks(cols))
+        return cls(cols)
+
+    def order(self, sort, direction):
+        key = (sort, direction)
+        if key not in self.orders:
+            rank = self.ranks[sort]
+            self.orders[key] = np.argsort(rank if direction == "asc" else -rank, kind="stable")
+        return self.orders[key]
+
+    def piece_rows(self, piece):
+        """Sorted rows with `piece` inside a title word, product ID or category."""
+        with self.lock:
+            if piece in self.piece_cache:
+                self.piece_cache.move_to_end(piece)
+                return self.piece_cache[piece]
+        rows = np.flatnonzero(self.piece_mask(piece))
+        with self.lock:
+            self.piece_cache[piece] = rows
+            if len(self.piece_cache) > PIECE_CACHE:
+                self.piece_cache.popitem(last=False)
+        return rows
+
+    def piece_mask(self, piece):
+        data = piece.encode("utf-8")
+        if b"\0" in data:
+            return np.zeros(self.size, dtype=bool)
+        cat_hit = np.array([piece in c for c in self.cat_lower] + [False])
+        hit = cat_hit[self.codes]
+
+        # Byte offsets of every occurrence, mapped to the words they fall in
+        positions = [m.start() for m in re.finditer(re.escape(data), self.word_bytes)]
+        if positions:
+            words = np.unique(np.searchsorted(self.word_starts, positions, side="right") - 1)
+            if len(words) <= FEW_WORDS:
+                hit[np.concatenate([self.postings[self.posting_starts[w]:self.posting_starts[w + 1]] for w in words])] = True
+            else:
+                word_hit = np.zeros(len(self.posting_counts), dtype=bool)
+                word_hit[words] = True
+                hit[self.postings[np.repeat(word_hit, self.posting_counts)]] = True
+
+        # Product IDs, skipped when the piece has a character no ID has
+        if set(data) <= self.pid_bytes and len(data) <= self.pid_columns.shape[1]:
+            columns = self.pid_columns
+            for start in range(columns.shape[1] - len(data) + 1):
+                match = columns[:, start] == data[0]
+                for k in range(1, len(data)):
+                    match &= columns[:, start + k] == data[k]
+                hit |= match
+        return hit
+
+    def haystack(self, i):
+        return f"{self.cols['title'][i]} {self.cols['pid'][i]} {self.cats[self.codes[i]]}".lower()
+
+    def search_rows(self, term):
+        """Sorted rows whose "title product-ID category" contains the lower-cased term."""
+        pieces = sorted({piece for piece in term.split(" ") if piece}, key=len, reverse=True)
+        rows = self.piece_rows(pieces[0]) if pieces else self.rows
+        for piece in pieces[1:]:
+            if not len(rows):
+                break
+            mask = np.zeros(self.size, dtype=bool)
+            mask[self.piece_rows(piece)] = True
+            rows = rows[mask[rows]]
+        if " " in term:
+            rows = np.array([i for i in rows.tolist() if term in self.haystack(i)], dtype=np.int64)
+        return rows
+
+    def query(self, search="", category="all", min_pct=0.0, max_pct=100.0, hide_zero=True, sort="v",
+              direction="desc", page=1, per_page=100):
+        """(rows matching, row numbers of the requested page in sort order)."""
+        if sort not in self.ranks:
+            raise ValueError(f"sort must be one of {', '.join(FinalSiteGen.SORT_KEYS)}")
+        if direction not in ("asc", "desc"):
+            raise ValueError("dir must be asc or desc")
+        category = category.lower()
+        codes = None if category == "all" else [k for k, c in enumerate(self.cat_lower) if c == category]
+        cat_ok = None
+        if codes is not None:
+            cat_ok = np.zeros(len(self.cats), dtype=bool)
+            cat_ok[codes] = True
+        end = page * per_page
+
+        def pct_ok(values):
+            ok = (values >= min_pct) & (values <= max_pct)
+            return ok & (values > 0) if hide_zero else ok
+
+        term = search.lower()
+        if term:
+            candidates = self.search_rows(term)
+            keep = pct_ok(self.pct[candidates])
+            if cat_ok is not None:
+                keep &= cat_ok[self.codes[candidates]]
+            candidates = candidates[keep]
+            total = len(candidates)
+        else:
+            # Rows in the % range, straight from the discount index
+            slices = []
+            for code in ([None] if codes is None else codes):
+                order, values = self.by_pct[code]
+                low = np.searchsorted(values, min_pct, side="left")
+                if hide_zero:
+                    low = max(low, np.searchsorted(values, 0, side="right"))
+                high = np.searchsorted(values, max_pct, side="right")
+                slices.append(order[low:max(low, high)])
+            total = sum(len(s) for s in slices)
+            if total * EXPLICIT_SHARE > self.size:
+                return total, self.scan(sort, direction, pct_ok, cat_ok, end)[end - per_page:end]
+            candidates = np.concatenate(slices) if slices else self.rows[:0]
+
+        # Sort key: rank, then catalogue order for ties whichever the direction
+        rank = self.ranks[sort][candidates]
+        if direction == "desc":
+            rank = rank.max(initial=0) - rank
+        key = rank * self.size + candidates
+        if end < len(key):
+            top = np.argpartition(key, end - 1)[:end]
+            top = top[np.argsort(key[top])]
+        else:
+            top = np.argsort(key)
+        return total, candidates[top[end - per_page:end]]
+
+    def scan(self, sort, direction, pct_ok, cat_ok, end):
+        """The first `end` matching rows of the presorted order, read a chunk at a time."""
+        order = self.order(sort, direction)
+        found, count = [], 0
+        for start in range(0, self.size, SCAN_CHUNK):
+            chunk = order[start:start + SCAN_CHUNK]
+            keep = pct_ok(self.pct[chunk])
+            if cat_ok is not None:
+                keep &= cat_ok[self.codes[chunk]]
+            found.append(chunk[keep])
+            count += len(found[-1])
+            if count >= end:
+                break
+        return np.concatenate(found) if found else self.rows[:0]
+
+    def records(self, rows):
+        """The page's row fields (see decodeDeals in FinalSiteGen.py) for row numbers `rows`."""
+        c = self.cols
+        orig, disc = c["orig"][rows], c["disc"][rows]
+        vp = np.where(np.isnan(disc), np.nan_to_num(orig, nan=0.0), disc)
+        low = c["low"][rows] if "low" in c else np.full(len(rows), np.nan)
+        prev = c["prev"][rows] if "prev" in c else np.full(len(rows), np.nan)
+        return [
+            {"n": c["title"][i], "p": c["pid"][i], "id": c["vid"][i],
+             "l": FinalSiteGen.BASE_URL + c["handle"][i] if c["handle"][i] else "#",
+             "o": o, "d": d, "v": float(self.pct[i]), "vp": float(x), "c": self.cats[self.codes[i]],
+             "lo": None if lo != lo else lo, "pp": None if pp != pp else pp}
+            for i, o, d, x, lo, pp in zip(rows.tolist(), FinalSiteGen.fmt_prices(orig), FinalSiteGen.fmt_prices(disc),
+                                          vp.tolist(), low.tolist(), prev.tolist())
+        ]
+
+
+def query_args(params):
+    """DealIndex.query() keyword arguments from a parsed query string; ValueError when one is bad."""
+    def one(name, default):
+        return params.get(name, [default])[-1]
+
+    args = {
+        "search": one("search", ""),
+        "category": one("category", "all"),
+        "min_pct": float(one("minPct", "0")),
+        "max_pct": float(one("maxPct", "100")),
+        "hide_zero": one("hideZero", "1").lower() not in ("0", "false", "no"),
+        "sort": one("sort", "v"),
+        "direction": one("dir", "desc"),
+        "page": int(one("page", "1")),
+        "per_page": int(one("perPage", "100")),
+    }
+    if args["page"] < 1 or not 1 <= args["per_page"] <= MAX_PER_PAGE:
+        raise ValueError(f"page must be 1 or more and perPage 1 to {MAX_PER_PAGE}")
+    return args
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    index = None  # set by serve()
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, payload):
+        body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        index = self.index
+        if url.path == "/deals":
+            try:
+                args = query_args(parse_qs(url.query))
+                total, rows = index.query(**args)
+            except ValueError as e:
+                return self.reply(400, {"error": str(e)})
+            pages = max(-(-total // args["per_page"]), 1)
+            return self.reply(200, {"total": total, "page": args["page"], "pages": pages,
+                                    "rows": index.records(rows)})
+        if url.path == "/categories":
+            counts = np.bincount(index.codes, minlength=len(index.cats)).tolist()
+            return self.reply(200, {"categories": [{"name": c, "rows": k} for c, k in zip(index.cats, counts)],
+                                    "rows": index.size})
+        self.reply(404, {"error": "not found"})
+
+
+def serve(index, host="127.0.0.1", port=8000):
+    """An HTTP server answering queries from `index`; port 0 picks a free one."""
+    handler = type("IndexHandler", (Handler,), {"index": index})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve deal queries from the scraped catalogue.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    index = DealIndex.from_files()
+    server = serve(index, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Serving {index.size} deals at http://{host}:{port}/deals", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
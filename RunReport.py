@@ -0,0 +1,203 @@
+"""Timings, counters and peak memory for one run of a pipeline stage, saved as JSON.
+
+ScraperBetterTitle.py and FinalSiteGen.py each fill in a RunReport as they go
+(phase timings plus whatever figures the stage adds) and write it next to
+their output when they finish, so the daily job leaves a record of where its
+minutes went. Profiling is opt in, with the stages' --profile option or the
+JB_PROFILE environment variable:
+
+    cprofile      cProfile the stage; the top functions go in the report and the
+                  full stats in <report>.prof (open with python -m pstats). Only
+                  the calling thread is profiled, so fetch and compression
+                  threads show up as time spent waiting on them.
+    tracemalloc   trace Python allocations; each phase gets its peak and the
+                  report lists the biggest allocation sites left at the end
+"""
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+PROFILE_ENV = "JB_PROFILE"
+PROFILE_MODES = ("cprofile", "tracemalloc")
+PROFILE_TOP = 25  # functions / allocation sites listed in the report
+SLOW_FACTOR = 1.5  # warn when a stage takes this much longer than its last report says
+SLOW_MIN_SECONDS = 30.0  # ...and took at least this long, so short runs don't warn on noise
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, or None where it can't be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """{"p50": ..., "max": ...} for a list of numbers, nearest-rank; empty if there are none."""
+    values = sorted(values)
+    if not values:
+        return {}
+    result = {f"p{p}": round(values[min(len(values) - 1, len(values) * p // 100)], 4) for p in points}
+    result["max"] = round(values[-1], 4)
+    return result
+
+
+class RunReport:
+    """Phase timings and figures for one stage, written to `path` as JSON by finish().
+
+    Use as a context manager, which starts any profiling on entry and writes
+    the report on exit, errors included. With path=None nothing is written,
+    so code can always time its phases whether or not anyone asked for a
+    report.
+    """
+
+    def __init__(self, stage, path=None, profile=None):
+        if profile is None:
+            profile = os.environ.get(PROFILE_ENV) or None
+        if profile is not None and profile not in PROFILE_MODES:
+            raise ValueError(f"unknown profile mode {profile!r}, expected one of {', '.join(PROFILE_MODES)}")
+        self.stage = stage
+        self.path = path
+        self.profile = profile
+        self.phases = {}
+        self.data = {}
+        self.profiler = None
+        self.open_peaks = []  # running peak of each phase being traced, outermost first
+        self.traced_peak = 0
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.data["error"] = f"{exc_type.__name__}: {exc}"
+        self.finish()
+        return False
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+        if self.profile == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profile == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the block under `name`; repeated blocks with one name add up. Phases may nest."""
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # Resetting the peak for this phase must not lose the outer phases' peaks
+            self.fold_peak()
+            tracemalloc.reset_peak()
+            self.open_peaks.append([0])
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+            if tracing:
+                self.fold_peak()
+                peak = round(self.open_peaks.pop()[0] / 1e6, 1)
+                entry = self.phases[name]
+                entry["peak_traced_mb"] = max(entry.get("peak_traced_mb", 0.0), peak)
+
+    def fold_peak(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        self.traced_peak = max(self.traced_peak, peak)
+        for open_peak in self.open_peaks:
+            open_peak[0] = max(open_peak[0], peak)
+
+    def add_time(self, name, seconds):
+        entry = self.phases.setdefault(name, {"seconds": 0.0, "count": 0})
+        entry["seconds"] += seconds
+        entry["count"] += 1
+
+    def seconds(self, name):
+        return self.phases.get(name, {}).get("seconds", 0.0)
+
+    def finish(self):
+        """Stop profiling and write the report; returns it as a dict."""
+        report = {
+            "stage": self.stage,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - self.started, 3),
+            "python": platform.python_version(),
+            "peak_rss_mb": peak_rss_mb(),
+            "phases": {name: {k: round(v, 3) if isinstance(v, float) else v for k, v in entry.items()}
+                       for name, entry in self.phases.items()},
+            **self.data,
+        }
+        if self.profiler is not None:
+            self.profiler.disable()
+            report["profile"] = self.cprofile_summary()
+        elif self.profile == "tracemalloc" and tracemalloc.is_tracing():
+            report["profile"] = self.tracemalloc_summary()
+            tracemalloc.stop()
+        if self.path:
+            self.warn_if_slower(report)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=1)
+            os.replace(tmp, self.path)
+            print(f"Run report saved → {self.path}")
+        return report
+
+    def cprofile_summary(self):
+        prof_path = os.path.splitext(self.path)[0] + ".prof" if self.path else None
+        if prof_path:
+            self.profiler.dump_stats(prof_path)
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+        return {
+            "mode": "cprofile",
+            "stats_file": prof_path,
+            "top_cumulative": [
+                {"function": f"{os.path.basename(file)}:{line}({func})", "calls": calls,
+                 "own_seconds": round(own, 4), "cumulative_seconds": round(cumulative, 4)}
+                for (file, line, func), (_, calls, own, cumulative, _) in top
+            ],
+        }
+
+    def tracemalloc_summary(self):
+        self.fold_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        sites = tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP]
+        return {
+            "mode": "tracemalloc",
+            "current_traced_mb": round(current / 1e6, 1),
+            "peak_traced_mb": round(self.traced_peak / 1e6, 1),
+            "top_allocations": [{"site": str(s.traceback[0]), "mb": round(s.size / 1e6, 2), "blocks": s.count}
+                                for s in sites],
+        }
+
+    def warn_if_slower(self, report):
+        """Compare with the report the last run left at self.path and warn if this run is much slower."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            return
+        before, now = previous.get("seconds"), report["seconds"]
+        report["previous_seconds"] = before
+        if before and now >= SLOW_MIN_SECONDS and now > before * SLOW_FACTOR:
+            message = f"{self.stage} took {now:.0f}s, {now / before:.1f}x the {before:.0f}s of the last run"
+            # Shows up as an annotation on the run when this is a GitHub Actions job
+            print(f"::warning::{message}" if os.environ.get("GITHUB_ACTIONS") == "true" else f"Warning: {message}")
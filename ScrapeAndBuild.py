@@ -0,0 +1,41 @@
+"""Scrape the store and build the site in one process.
+
+Rows go from scrape() straight into FinalSiteGen's DealStream as each page
+arrives, so the per-row work of the site build happens while the crawl is
+waiting on the network. Only the whole-catalogue steps (sort ranks, shards,
+search index, compression) run after it. The files written are the same as
+running ScraperBetterTitle.py and then FinalSiteGen.py, run reports included;
+the formatting done during the crawl shows up as the scrape report's on_rows
+phase.
+"""
+import argparse
+import time
+
+import FinalSiteGen
+import ScraperBetterTitle
+from RunReport import RunReport
+
+
+def scrape_and_build(**options):
+    """Run scrape() with `options`, feeding the site build; returns (crawl, build) seconds."""
+    stream = FinalSiteGen.DealStream()
+    started = time.time()
+    ScraperBetterTitle.scrape(**options, on_rows=stream.add)
+    crawled = time.time()
+    with RunReport("site", FinalSiteGen.SITE_REPORT, options.get("profile")) as report:
+        with report.phase("format"):
+            cols = stream.columns()
+        FinalSiteGen.build_site(cols, report)
+    return crawled - started, time.time() - crawled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape the JB Hi-Fi NZ catalogue and build the site from it.")
+    args = ScraperBetterTitle.add_scrape_arguments(parser).parse_args()
+
+    crawl, build = scrape_and_build(**ScraperBetterTitle.scrape_options(args))
+    print(f"Crawl took {crawl:.1f}s, site build after it {build:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Scrape several JB Hi-Fi storefronts at once and build a site for each.
+
+Every store in STORES gets ScrapeAndBuild's scrape + build in a process of its
+own, run inside the store's directory with the scraper and the site generator
+pointed at the store's base URL. Stores share only the code: each has its own
+connection pool and rate controller, page cache, checkpoint, price history,
+run reports and site. They run side by side, so a run takes about as long as
+its slowest store rather than the sum. Output lines are prefixed with the
+store's name.
+
+    python ScrapeStores.py                      # every store in STORES
+    python ScrapeStores.py --stores au --workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+
+import FinalSiteGen
+import ScraperBetterTitle
+from ScrapeAndBuild import scrape_and_build
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# dir is relative to this file; NZ keeps the repo root so its site stays where it always was.
+# Optional "workers" / "rate" entries override the command-line values for that store.
+STORES = {
+    "nz": {"base": "https://www.jbhifi.co.nz", "dir": ".", "timezone": "Pacific/Auckland"},
+    "au": {"base": "https://www.jbhifi.com.au", "dir": "au", "timezone": "Australia/Sydney"},
+}
+
+
+class PrefixedOutput:
+    """Text stream writing each complete line to `stream` with `prefix` in front."""
+
+    def __init__(self, stream, prefix):
+        self.stream = stream
+        self.prefix = prefix
+        self.pending = ""
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            lines = (self.pending + text).split("\n")
+            self.pending = lines.pop()
+            for line in lines:
+                self.stream.write(f"{self.prefix}{line}\n")
+            if lines:
+                self.stream.flush()
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                self.stream.write(f"{self.prefix}{self.pending}\n")
+                self.pending = ""
+            self.stream.flush()
+
+
+def use_store(store):
+    """Point ScraperBetterTitle and FinalSiteGen at `store` and move into its directory."""
+    base = store["base"]
+    ScraperBetterTitle.BASE = base
+    ScraperBetterTitle.PRODUCTS_JSON = base + "/products.json"
+    ScraperBetterTitle.COLLECTIONS_JSON = base + "/collections.json"
+    FinalSiteGen.BASE_URL = base + "/products/"
+    FinalSiteGen.TIMEZONE = store.get("timezone", FinalSiteGen.TIMEZONE)
+
+    store_dir = os.path.join(ROOT, store["dir"])
+    # Hot links and the "What's New" text come from the repo root unless the store has its own
+    for name in ("HOTLINKS_CSV", "WHATS_NEW_FILE"):
+        path = getattr(FinalSiteGen, name)
+        if not os.path.exists(os.path.join(store_dir, path)):
+            setattr(FinalSiteGen, name, os.path.join(ROOT, path))
+    os.makedirs(store_dir, exist_ok=True)
+    os.chdir(store_dir)
+
+
+def run_store(job):
+    """Scrape and build one store; runs in a pool process of its own. Returns a summary dict."""
+    name, options = job
+    store = STORES[name]
+    sys.stdout = PrefixedOutput(sys.__stdout__, f"[{name}] ")
+    sys.stderr = PrefixedOutput(sys.__stderr__, f"[{name}] ")
+    started = time.time()
+    try:
+        use_store(store)
+        crawl, build = scrape_and_build(**{**options, **{k: store[k] for k in ("workers", "rate") if k in store}})
+        return {"store": name, "crawl": crawl, "build": build, "seconds": time.time() - started}
+    except Exception as e:
+        traceback.print_exc()
+        return {"store": name, "error": f"{type(e).__name__}: {e}", "seconds": time.time() - started}
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape several JB Hi-Fi stores in parallel and build a site for each.")
+    parser.add_argument("--stores", nargs="+", choices=sorted(STORES), default=list(STORES),
+                        help="stores to run (default: all of them)")
+    args = ScraperBetterTitle.add_scrape_arguments(parser).parse_args()
+    options = ScraperBetterTitle.scrape_options(args)
+
+    started = time.time()
+    # maxtasksperchild=1: every store starts from a fresh process with the modules' own defaults
+    with multiprocessing.Pool(len(args.stores), maxtasksperchild=1) as pool:
+        results = pool.map(run_store, [(name, options) for name in args.stores], chunksize=1)
+
+    print(f"\n{len(results)} stores in {time.time() - started:.1f}s:")
+    for r in results:
+        if "error" in r:
+            print(f"  {r['store']}: FAILED after {r['seconds']:.1f}s — {r['error']}")
+        else:
+            print(f"  {r['store']}: crawl {r['crawl']:.1f}s, site build {r['build']:.1f}s")
+    failed = [r["store"] for r in results if "error" in r]
+    if failed:
+        sys.exit(f"Stores failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,80 @@
 import requests
+import numpy as np
 import csv
+import json
+import codecs
+import re
+import os
+import math
 import time
+import random
+import threading
+import argparse
+import sqlite3
+import zipfile
+from contextlib import closing
+from functools import partial
+from itertools import islice
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+
+from RunReport import RunReport, percentiles
 
 BASE = "https://www.jbhifi.co.nz"
 PRODUCTS_JSON = BASE + "/products.json"
+COLLECTIONS_JSON = BASE + "/collections.json"
 LIMIT = 250
 OUTPUT_FILE = "jbhifi_products_with_category.csv"
+TYPED_FILE = "jbhifi_products_with_category.npz"  # same rows with typed columns, read by FinalSiteGen.py
+CACHE_FILE = "scrape_cache.db"  # page validators and bodies + last run's prices, for incremental runs
+CHECKPOINT_FILE = OUTPUT_FILE + ".checkpoint"  # crawl progress, for resuming an interrupted run
+CHECKPOINT_INTERVAL = 5.0  # seconds between checkpoint writes
+CHECKPOINT_MAX_AGE = 6 * 3600  # older ones are another day's crawl: a re-run resumes, the next daily run doesn't
+HISTORY_DB = "price_history.db"  # price changes per variant and day, appended after every run
+SCRAPE_REPORT = "scrape_report.json"  # timings and per-page figures for the last run, see RunReport.py
 
-PAGE_DELAY = 0.1
 MAX_ERRORS = 5
+MAX_PAGE = 100  # Shopify stops paginating at 25,000 items
+
+# Partitioned crawl: when /products.json hits the page cap, walk every
+# collection's own products.json too ("auto"), always do it, or never.
+PARTITION = "auto"
+SKIP_COLLECTIONS = {"all", "frontpage"}  # mirrors of the whole catalogue
+
+# Concurrent fetching (CONCURRENCY = 1 keeps the old one-page-at-a-time crawl)
+CONCURRENCY = 4   # max pages in flight
+RATE_LIMIT = 8.0  # starting requests per second to the store, 0 = unpaced
+
+# Adaptive (AIMD) pacing: add RATE_STEP req/s after each quick answer,
+# multiply by RATE_BACKOFF whenever the store throttles or slows down.
+MIN_RATE = 0.5
+MAX_RATE = 40.0
+RATE_STEP = 0.5
+RATE_BACKOFF = 0.5
+SLOW_RESPONSE = 3.0  # seconds; slower answers count as congestion
+
+# Retries for 429 / 5xx / network errors
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 60.0  # cap on our own jittered backoff
+RETRY_AFTER_MAX = 15 * 60.0  # longest Retry-After we wait out; a longer one is cut to this
+
+STREAM_CHUNK = 64 * 1024  # bytes read per step while parsing a page
+
+CSV_HEADER = [
+    "Product ID",
+    "Variant ID",
+    "Handle",  # Added Header
+    "Title",
+    "Original Price",
+    "Discounted Price",
+    "Discount %",
+    "Category"
+]
 
 
 def is_gift_card(title: str) -> bool:
@@ -18,21 +84,643 @@ def is_gift_card(title: str) -> bool:
     return "gift card" in t or "giftcard" in t or "gift-card" in t
 
 
-def fetch_products(page: int):
-    url = f"{PRODUCTS_JSON}?limit={LIMIT}&page={page}"
-    print(f"Fetching URL: {url}")
+class RateController:
+    """AIMD request pacing shared by every fetch thread.
+
+    Request start times are spaced 1/rate apart. Each quick successful answer
+    nudges the rate up by RATE_STEP; a throttle (429/5xx, a slow answer or an
+    explicit Retry-After) cuts it by RATE_BACKOFF and pauses everyone until the
+    server said we may come back.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, min_rate=MIN_RATE, max_rate=MAX_RATE):
+        self.enabled = bool(rate and rate > 0)
+        self.rate = min(max(rate, min_rate), max_rate) if self.enabled else 0.0
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.next_at = 0.0
+        self.lock = threading.Lock()
 
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_at)
+            if self.enabled:
+                self.next_at = start + 1.0 / self.rate
+        delay = start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return max(delay, 0.0)
+
+    def success(self, latency: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            if latency > SLOW_RESPONSE:
+                self.rate = max(self.rate * RATE_BACKOFF, self.min_rate)
+            else:
+                self.rate = min(self.rate + RATE_STEP, self.max_rate)
+
+    def throttled(self, pause: float = 0.0):
+        with self.lock:
+            if self.enabled:
+                self.rate = max(self.rate * RATE_BACKOFF, self.min_rate)
+            self.next_at = max(self.next_at, time.monotonic() + pause)
+
+
+def retry_after_seconds(response):
+    """Parse a Retry-After header (delta-seconds or HTTP date), or None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
     try:
-        r = requests.get(url, timeout=20)
-        if r.status_code != 200:
-            print(f"  HTTP {r.status_code} on page {page}")
-            return None
-        return r.json().get("products", [])
-    except Exception as e:
-        print(f"  Request error: {e}")
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
         return None
 
 
+def backoff_delay(attempt: int, retry_after=None) -> float:
+    """Exponential backoff with full jitter, never shorter than Retry-After.
+
+    The jitter is capped at BACKOFF_MAX, but the server's Retry-After is
+    honoured up to RETRY_AFTER_MAX: retrying sooner than it asked would only
+    use up MAX_RETRIES on more 429s.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, RETRY_AFTER_MAX))
+    return delay
+
+
+def make_session(pool_size: int = 1) -> requests.Session:
+    """Keep-alive session whose connection pool fits every in-flight page."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_WS_COMMA = re.compile(r"[\s,]*")
+
+
+def iter_json_array(chunks, key="products"):
+    """Yield the items of the `key` array of a streamed JSON object one by one.
+
+    `chunks` is an iterable of UTF-8 bytes (e.g. Response.iter_content). Only
+    the current item and the unread part of the stream are kept in memory,
+    never the whole decoded page. Items must be JSON objects.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf, pos = "", 0
+
+    def more():
+        nonlocal buf, pos
+        chunk = next(chunks, None)
+        text = utf8.decode(chunk or b"", final=chunk is None)
+        if chunk is None and not text:
+            return False
+        buf, pos = buf[pos:] + text, 0
+        return True
+
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    while True:
+        m = start.search(buf)
+        if m:
+            pos = m.end()
+            break
+        if not more():
+            return
+
+    while True:
+        pos = _WS_COMMA.match(buf, pos).end()
+        if pos >= len(buf):
+            if not more():
+                raise ValueError(f"Truncated JSON: '{key}' array never closed")
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if not more():
+                raise
+            continue
+        yield item
+
+
+def slim_product(p):
+    """Keep only the fields product_rows() reads, dropping body_html, images etc."""
+    return {
+        "id": p.get("id"),
+        "title": p.get("title", ""),
+        "handle": p.get("handle", ""),
+        "product_type": p.get("product_type", ""),
+        "tags": p.get("tags", ""),
+        "variants": [
+            {"id": v.get("id"), "price": v.get("price"), "compare_at_price": v.get("compare_at_price")}
+            for v in p.get("variants", [])
+        ],
+    }
+
+
+def slim_collection(c):
+    return {"handle": c.get("handle", ""), "products_count": c.get("products_count")}
+
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    items TEXT NOT NULL  -- the page's slimmed items, as JSON
+);
+-- Variant prices of the last finished run, and of the run under way
+CREATE TABLE IF NOT EXISTS last_prices (variant_id INTEGER PRIMARY KEY, price REAL);
+CREATE TABLE IF NOT EXISTS run_prices (variant_id INTEGER PRIMARY KEY, price REAL);
+"""
+
+
+class PageCache:
+    """Change-detection cache kept between runs in CACHE_FILE, an SQLite database.
+
+    For every page URL it remembers the ETag / Last-Modified validators and the
+    slimmed items the page returned, so an unchanged page can be answered with
+    a 304 and replayed from disk. It also keeps the previous run's variant
+    prices, to report what changed. Only the validators are held in memory:
+    page bodies are written as they arrive and read back one page at a time,
+    and prices go straight to disk. Pages not seen in the current run are
+    dropped when it is saved.
+
+    The fetch threads share one connection, so every use of it holds the lock.
+    """
+
+    def __init__(self, path=CACHE_FILE, full_refresh=False):
+        self.path = path
+        self.full_refresh = full_refresh
+        self.resumed = False
+        self.seen = set()
+        self.lock = threading.Lock()
+        try:
+            self.con = self.connect()
+        except sqlite3.DatabaseError as e:
+            print(f"Ignoring unreadable cache {path}: {e}")
+            os.remove(path)
+            self.con = self.connect()
+        self.validators = {url: (etag, last_modified) for url, etag, last_modified
+                           in self.con.execute("SELECT url, etag, last_modified FROM pages")}
+        self.has_previous = self.con.execute("SELECT 1 FROM last_prices LIMIT 1").fetchone() is not None
+        self.con.execute("DELETE FROM run_prices")
+        self.con.commit()
+
+    def connect(self):
+        con = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript(CACHE_SCHEMA)
+        except sqlite3.DatabaseError:
+            con.close()
+            raise
+        return con
+
+    def headers(self, url):
+        etag, last_modified = (None, None) if self.full_refresh else self.validators.get(url, (None, None))
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def not_modified(self, url):
+        """Replay a page the server answered with 304."""
+        with self.lock:
+            self.seen.add(url)
+            items, = self.con.execute("SELECT items FROM pages WHERE url = ?", (url,)).fetchone()
+        return json.loads(items)
+
+    def store(self, url, response, items):
+        body = json.dumps(items, separators=(",", ":"))
+        with self.lock:
+            self.seen.add(url)
+            self.con.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                             (url, response.headers.get("ETag"), response.headers.get("Last-Modified"), body))
+            self.con.commit()
+
+    def record_rows(self, rows):
+        with self.lock:
+            self.con.executemany("INSERT OR REPLACE INTO run_prices VALUES (?, ?)", ((row[1], row[5]) for row in rows))
+            self.con.commit()
+
+    def report_changes(self):
+        if not self.has_previous:
+            print("No previous run cached — change report skipped.")
+            return
+        with self.lock:
+            added, repriced = self.con.execute(
+                "SELECT count(*) - count(l.variant_id), count(l.variant_id) - sum(l.price = r.price) "
+                "FROM run_prices r LEFT JOIN last_prices l USING (variant_id)").fetchone()
+            removed, = self.con.execute(
+                "SELECT count(*) FROM last_prices WHERE variant_id NOT IN (SELECT variant_id FROM run_prices)"
+            ).fetchone()
+        print(f"Since last run: {added} variants added, {removed} removed, {repriced or 0} repriced")
+
+    def resume(self, part_file):
+        """Pick up variant prices already written by the interrupted run.
+
+        Pages fetched before the interruption are not in this run's `seen`,
+        so nothing is dropped from the cache when it is saved.
+        """
+        self.resumed = True
+        with open(part_file, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            with self.lock:
+                self.con.execute("DELETE FROM run_prices")
+                self.con.executemany("INSERT OR REPLACE INTO run_prices VALUES (?, ?)",
+                                     ((int(row[1]), float(row[5])) for row in reader))
+                self.con.commit()
+
+    def save(self):
+        """Make this run's prices the last run's, drop pages it never saw, and close the cache."""
+        with self.lock:
+            with self.con:
+                if not self.resumed:
+                    self.con.execute("CREATE TEMP TABLE seen (url TEXT PRIMARY KEY)")
+                    self.con.executemany("INSERT INTO seen VALUES (?)", ((url,) for url in self.seen))
+                    self.con.execute("DELETE FROM pages WHERE url NOT IN (SELECT url FROM seen)")
+                self.con.execute("DELETE FROM last_prices")
+                self.con.execute("INSERT INTO last_prices SELECT * FROM run_prices")
+                self.con.execute("DELETE FROM run_prices")
+            self.con.close()
+
+
+TEXT_COLUMNS = {"Handle", "Title", "Category"}
+
+
+RESUME_BATCH = 5000  # rows of an interrupted run's CSV read back at a time
+
+
+class TypedExport:
+    """The CSV's columns as NumPy arrays, built a page at a time as rows are written.
+
+    IDs are int64 and prices float64, so FinalSiteGen.py can load them without
+    parsing any text. Each text column is one UTF-8 byte array holding its
+    values, each terminated by a NUL. Every page's rows are turned into small
+    arrays as they arrive, so the whole catalogue is only ever held in this
+    compact form, and save() joins them without reading the CSV back. Arrays
+    are named after the CSV header. The CSV itself stays as the human-readable
+    export.
+    """
+
+    def __init__(self):
+        self.chunks = {name: [] for name in CSV_HEADER}
+
+    @staticmethod
+    def column(name, values):
+        if name in TEXT_COLUMNS:
+            # as the CSV has it: None is written as an empty cell
+            text = "".join(("" if v is None else str(v)) + "\0" for v in values)
+            return np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+        return np.array(values, dtype=np.int64 if name.endswith(" ID") else np.float64)
+
+    def add(self, rows):
+        for name, values in zip(CSV_HEADER, zip(*rows)):
+            self.chunks[name].append(self.column(name, values))
+
+    def save(self, out_path=TYPED_FILE):
+        """Write the columns as an .npz file (what np.savez writes), joining one column at a time."""
+        with zipfile.ZipFile(out_path + ".part", "w") as z:
+            for name in CSV_HEADER:
+                parts = self.chunks.pop(name)
+                array = np.concatenate(parts) if parts else self.column(name, ())
+                del parts[:]
+                with z.open(name + ".npy", "w", force_zip64=True) as f:
+                    np.lib.format.write_array(f, array)
+        os.replace(out_path + ".part", out_path)
+
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    day TEXT PRIMARY KEY,
+    scraped_at TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    changes INTEGER NOT NULL
+);
+-- One row per variant per day its price changed; NULL prices mark the day it disappeared.
+CREATE TABLE IF NOT EXISTS prices (
+    variant_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    price REAL,
+    original REAL,
+    PRIMARY KEY (variant_id, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS prices_by_day ON prices (day);
+-- Current state of every variant, so readers never have to replay `prices`.
+CREATE TABLE IF NOT EXISTS variants (
+    variant_id INTEGER PRIMARY KEY,
+    price REAL,
+    original REAL,
+    since TEXT NOT NULL,
+    prev_price REAL,
+    lowest REAL,
+    lowest_day TEXT
+);
+"""
+
+
+def record_price_history(csv_path=OUTPUT_FILE, db_path=HISTORY_DB, day=None):
+    """Append a finished scrape to the price-history store in db_path.
+
+    Only variants whose price changed since the run before (including new and
+    vanished ones) get a row in `prices`, keyed by variant and day. The
+    `variants` table keeps each variant's current price, the price before its
+    last change and its lowest price ever. A second run on the same day
+    replaces that day's changes. The CSV is streamed into a temporary table
+    and compared with `variants` in SQL, so no variant is held in memory.
+    Everything is written in one transaction.
+
+    The daily workflow keeps db_path as an asset of the repo's
+    "price-history" release, downloaded before the scrape and uploaded after
+    it, and fails rather than start a new store when the asset is missing.
+    """
+    day = day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    with closing(sqlite3.connect(db_path)) as con:
+        con.executescript(HISTORY_SCHEMA)
+        con.execute("CREATE TEMP TABLE today (variant_id INTEGER PRIMARY KEY, price REAL, original REAL)")
+        rows = 0
+        with open(csv_path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+
+            def today():
+                nonlocal rows
+                for row in reader:
+                    rows += 1
+                    yield int(row[1]), float(row[5]), float(row[4])
+
+            con.executemany("INSERT OR REPLACE INTO today VALUES (?, ?, ?)", today())
+
+        # New and repriced variants, then vanished ones (a NULL price) unless already marked gone
+        con.execute("""
+            CREATE TEMP TABLE changed AS
+            SELECT t.variant_id, t.price, t.original FROM today t LEFT JOIN variants v USING (variant_id)
+             WHERE v.variant_id IS NULL OR v.price IS NOT t.price OR v.original IS NOT t.original
+            UNION ALL
+            SELECT v.variant_id, NULL, NULL FROM variants v
+             WHERE v.price IS NOT NULL AND v.variant_id NOT IN (SELECT variant_id FROM today)
+        """)
+        with con:
+            con.execute("INSERT OR REPLACE INTO prices SELECT variant_id, ?, price, original FROM changed", (day,))
+            con.execute("""
+                INSERT OR REPLACE INTO variants
+                SELECT c.variant_id, c.price, c.original, :day,
+                       CASE WHEN v.since = :day THEN v.prev_price ELSE v.price END,
+                       CASE WHEN c.price < v.lowest OR (v.lowest IS NULL AND c.price IS NOT NULL)
+                            THEN c.price ELSE v.lowest END,
+                       CASE WHEN c.price < v.lowest OR (v.lowest IS NULL AND c.price IS NOT NULL)
+                            THEN :day ELSE v.lowest_day END
+                FROM changed c LEFT JOIN variants v USING (variant_id)
+            """, {"day": day})
+            changes = con.execute("SELECT count(*) FROM changed").fetchone()[0]
+            day_changes = con.execute("SELECT count(*) FROM prices WHERE day = ?", (day,)).fetchone()[0]
+            con.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)",
+                        (day, datetime.now(timezone.utc).isoformat(timespec="seconds"), rows, day_changes))
+    print(f"Price history: {changes} changes recorded for {day} in {db_path}")
+
+
+class Checkpoint:
+    """Crash-safe progress record for one crawl, kept next to the .part CSV.
+
+    Holds the last page handled per feed, the feeds that are finished, the
+    seen variant IDs and how many rows / bytes of the .part file they cover.
+    The .part file is fsynced before the checkpoint is atomically replaced, so
+    the checkpoint never points past data that is on disk; on resume the .part
+    file is cut back to the recorded size and any rows after it are refetched.
+    """
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self.file = None
+        self.last_page = {}
+        self.done = set()
+        self.seen_variants = set()
+        self.rows = 0
+        self.size = 0
+        self.capped = set()
+        self.collections = None
+        self.saved_at = 0.0
+
+    def load(self, part_file):
+        """Restore progress from disk; False if there is nothing usable to resume."""
+        if not (os.path.exists(self.path) and os.path.exists(part_file)):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return False
+        if data.get("base") != BASE or data.get("limit") != LIMIT:
+            return False
+        if time.time() - data.get("time", 0) > CHECKPOINT_MAX_AGE:
+            print("Checkpoint is too old — starting a fresh crawl.")
+            return False
+        if os.path.getsize(part_file) < data["size"]:
+            return False
+        self.last_page = data["last_page"]
+        self.done = set(data["done"])
+        self.seen_variants = set(data["seen_variants"])
+        self.rows = data["rows"]
+        self.size = data["size"]
+        self.capped = set(data["capped"])
+        self.collections = data["collections"]
+        with open(part_file, "r+b") as f:
+            f.truncate(self.size)
+        return True
+
+    def first_page(self, feed):
+        return self.last_page.get(feed, 0) + 1
+
+    def page_done(self, feed, page):
+        self.last_page[feed] = page
+        if time.monotonic() - self.saved_at >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def feed_done(self, feed):
+        self.done.add(feed)
+
+    def save(self):
+        if self.file is None:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.size = os.fstat(self.file.fileno()).st_size
+        data = {
+            "base": BASE,
+            "limit": LIMIT,
+            "time": time.time(),
+            "last_page": self.last_page,
+            "done": sorted(self.done),
+            "seen_variants": list(self.seen_variants),
+            "rows": self.rows,
+            "size": self.size,
+            "capped": sorted(self.capped),
+            "collections": self.collections,
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.saved_at = time.monotonic()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def feed_label(feed: str) -> str:
+    return feed[len(BASE):] if feed.startswith(BASE) else feed
+
+
+def release(r, reuse=True):
+    """Hand a streamed response's connection back to the session's pool.
+
+    Closing a response with unread body bytes (a 304/404/429, or the '}' after
+    the items) would drop its keep-alive connection, so what is left is read
+    first. A response that failed mid-body is just closed.
+    """
+    if reuse:
+        r.raw.drain_conn()
+    r.close()
+
+
+def counted(chunks, page_stats):
+    for chunk in chunks:
+        page_stats["bytes"] += len(chunk)
+        yield chunk
+
+
+def fetch_page(feed: str, page: int, key: str, slim, session=None, controller=None, stats=None, cache=None):
+    """Fetch one page of a paginated Shopify feed, retrying 429/5xx/network errors.
+
+    Returns the slimmed `key` items, or None once MAX_RETRIES is exhausted.
+    With a PageCache the request is made conditional and a 304 is answered
+    from the cache. When a `stats` dict is given, stats[(feed path, page)] is
+    filled with the page's status, retry count, bytes downloaded, time spent
+    waiting (pacing plus backoff), and for the final attempt the time to the
+    response headers ("latency") and to the last item parsed ("seconds").
+    """
+    url = f"{feed}?limit={LIMIT}&page={page}"
+    print(f"Fetching URL: {url}")
+
+    controller = controller or RateController(0)
+    headers = cache.headers(url) if cache else {}
+    page_stats = {"status": None, "retries": 0, "waited": 0.0, "bytes": 0, "latency": None, "seconds": None,
+                  "items": 0}
+    if stats is not None:
+        stats[(feed_label(feed), page)] = page_stats
+
+    for attempt in range(MAX_RETRIES + 1):
+        page_stats["waited"] += controller.wait()
+        r = None
+        failed = False
+        started = time.monotonic()
+        try:
+            r = (session or requests).get(url, timeout=20, stream=True, headers=headers)
+            page_stats["status"] = r.status_code
+            page_stats["latency"] = r.elapsed.total_seconds()
+            if r.status_code == 304 and headers:
+                controller.success(time.monotonic() - started)
+                page_stats["seconds"] = time.monotonic() - started
+                items = cache.not_modified(url)
+                page_stats["items"] = len(items)
+                return items
+            if r.status_code == 200:
+                chunks = counted(r.iter_content(STREAM_CHUNK), page_stats)
+                items = [slim(item) for item in iter_json_array(chunks, key)]
+                controller.success(time.monotonic() - started)
+                page_stats["seconds"] = time.monotonic() - started
+                page_stats["items"] = len(items)
+                if cache:
+                    cache.store(url, r, items)
+                return items
+            print(f"  HTTP {r.status_code} on page {page}")
+            if r.status_code not in RETRY_STATUSES:
+                return None
+        except Exception as e:
+            print(f"  Request error: {e}")
+            page_stats["status"] = type(e).__name__
+            failed = True
+        finally:
+            if r is not None:
+                release(r, reuse=not failed)
+
+        if attempt == MAX_RETRIES:
+            break
+        delay = backoff_delay(attempt, retry_after_seconds(r))
+        controller.throttled(delay)
+        page_stats["retries"] += 1
+        print(f"  Retrying page {page} in {delay:.1f}s (attempt {attempt + 2}/{MAX_RETRIES + 1})")
+
+    print(f"  Giving up on page {page} after {MAX_RETRIES} retries")
+    return None
+
+
+def fetch_products(page: int, session=None, controller=None, stats=None, feed=PRODUCTS_JSON, cache=None):
+    return fetch_page(feed, page, "products", slim_product, session, controller, stats, cache)
+
+
+def fetch_collections(page: int, session=None, controller=None, stats=None, feed=COLLECTIONS_JSON, cache=None):
+    return fetch_page(feed, page, "collections", slim_collection, session, controller, stats, cache)
+
+
+def report_page_stats(stats):
+    """Print a short summary of retries and waiting per page."""
+    if not stats:
+        return
+    retried = {k: s for k, s in sorted(stats.items()) if s["retries"]}
+    total_retries = sum(s["retries"] for s in stats.values())
+    total_wait = sum(s["waited"] for s in stats.values())
+    total_bytes = sum(s["bytes"] for s in stats.values())
+    unchanged = sum(1 for s in stats.values() if s["status"] == 304)
+    print(f"Pages fetched: {len(stats)} ({unchanged} unchanged), downloaded: {total_bytes / 1e6:.1f} MB, "
+          f"retries: {total_retries}, time waiting: {total_wait:.1f}s")
+    for (feed, page), s in retried.items():
+        print(f"  {feed} page {page}: {s['retries']} retries, waited {s['waited']:.1f}s, last status {s['status']}")
+
+
+def page_figures(stats, rows, crawl_seconds):
+    """The crawl's totals and per-page figures, for the run report."""
+    pages = [{"feed": feed, "page": page, **{k: round(v, 4) if isinstance(v, float) else v for k, v in s.items()}}
+             for (feed, page), s in sorted(stats.items())]
+    fetched = [s for s in stats.values() if s["status"] in (200, 304)]
+    return {
+        "rows": rows,
+        "crawl_seconds": round(crawl_seconds, 3),
+        "rows_per_sec": round(rows / crawl_seconds, 1) if crawl_seconds else None,
+        "pages_fetched": len(fetched),
+        "pages_per_sec": round(len(fetched) / crawl_seconds, 2) if crawl_seconds else None,
+        "statuses": {str(k): v for k, v in Counter(s["status"] for s in stats.values()).items()},
+        "retries": sum(s["retries"] for s in stats.values()),
+        "bytes": sum(s["bytes"] for s in stats.values()),
+        "waited_seconds": round(sum(s["waited"] for s in stats.values()), 3),
+        "latency": percentiles([s["latency"] for s in fetched]),
+        "page_seconds": percentiles([s["seconds"] for s in fetched]),
+        "pages": pages,
+    }
+
+
 def get_category(product):
     """Get category from product type. If blank fallback to tags."""
     cat = product.get("product_type", "").strip()
@@ -42,90 +730,306 @@ def get_category(product):
     return tags if tags else "Uncategorized"
 
 
-def scrape():
-    seen_variants = set()
-    rows = []
+def typed_row(row):
+    """A CSV row read back as the values product_rows() yielded for it."""
+    return [int(row[0]), int(row[1]), row[2], row[3], float(row[4]), float(row[5]), float(row[6]), row[7]]
 
-    page = 1
-    consecutive_errors = 0
 
-    while True:
+def product_rows(p, seen_variants):
+    """Turn one product into CSV rows, skipping variants already seen."""
+    pid = p.get("id")
+    title = p.get("title", "").strip()
+    handle = p.get("handle", "")  # Get the handle
 
-        products = fetch_products(page)
+    category = get_category(p)
 
-        if products is None:
-            consecutive_errors += 1
-            if consecutive_errors >= MAX_ERRORS:
-                print("Too many errors — stopping.")
-                break
-            page += 1
+    for v in p.get("variants", []):
+        vid = v.get("id")
+
+        if vid in seen_variants:
             continue
-        else:
-            consecutive_errors = 0
+        seen_variants.add(vid)
 
-        # TRUE stop condition – empty feed = end
-        if len(products) == 0:
-            print("Reached end of Shopify feed — stopping.")
-            break
+        if not is_gift_card(title):
+            price = float(v.get("price") or 0)
+            comp_raw = v.get("compare_at_price")
+            original = float(comp_raw) if comp_raw else price
+            disc = round((original - price) / original * 100, 2) if original > price else 0
 
-        for p in products:
-            pid = p.get("id")
-            title = p.get("title", "").strip()
-            handle = p.get("handle", "")  # Get the handle
-
-            category = get_category(p)
-
-            for v in p.get("variants", []):
-                vid = v.get("id")
-
-                if vid in seen_variants:
-                    continue
-                seen_variants.add(vid)
-
-                if not is_gift_card(title):
-                    price = float(v.get("price") or 0)
-                    comp_raw = v.get("compare_at_price")
-                    original = float(comp_raw) if comp_raw else price
-                    disc = round((original - price) / original * 100, 2) if original > price else 0
-
-                    rows.append([
-                        pid,
-                        vid,
-                        handle,  # Added handle to row
-                        title,
-                        original,
-                        price,
-                        disc,
-                        category
-                    ])
-
-        if page >= 100:
-            print("Reached Shopify 25,000 item limit (page 100). Stopping.")
-            break
+            yield [
+                pid,
+                vid,
+                handle,  # Added handle to row
+                title,
+                original,
+                price,
+                disc,
+                category
+            ]
+
+
+def iter_pages(tasks, session, controller, workers=CONCURRENCY, stats=None, fetch=fetch_products, ended=None):
+    """Yield (feed, page, items) for each (feed, page) task, in task order.
+
+    Up to `workers` pages are in flight at once over the shared keep-alive
+    session, paced by the shared RateController, so consecutive tasks from
+    different feeds are fetched in parallel. Results are handed back strictly
+    in task order so the output is the same whatever the concurrency. Once the
+    caller adds a feed to `ended`, its remaining tasks are skipped, and pages
+    still in flight when the caller stops iterating are cancelled.
+    """
+    workers = max(workers, 1)
+    ended = ended if ended is not None else set()
+    tasks = iter(tasks)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < workers:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                feed, page = task
+                if feed not in ended:
+                    future = pool.submit(fetch, page, session, controller, stats, feed)
+                    pending.append((feed, page, future))
+            if not pending:
+                return
+            feed, page, future = pending.popleft()
+            if feed in ended:
+                future.cancel()
+                continue
+            yield feed, page, future.result()
+    finally:
+        for _, _, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def crawl_feeds(feeds, session, controller, workers=CONCURRENCY, stats=None, fetch=fetch_products, capped=None,
+                checkpoint=None):
+    """Yield (feed, page, items) for every non-empty page of each (feed, last_page).
+
+    A feed ends at its first empty page, after MAX_ERRORS failed pages in a
+    row, or at MAX_PAGE; feeds that hit MAX_PAGE are added to `capped`.
+    last_page only says how many pages to queue up front: a feed that has not
+    ended by then is followed on, after the others, until it does.
+    With a Checkpoint, finished feeds and pages are skipped and progress is
+    recorded once the caller has handled each page.
+    """
+    ended = set()
+    errors = {}
+    if checkpoint:
+        ended.update(checkpoint.done)
+    first_page = {feed: checkpoint.first_page(feed) if checkpoint else 1 for feed, _ in feeds}
+
+    while feeds:
+        tasks = (
+            (feed, page)
+            for feed, last_page in feeds
+            for page in range(first_page[feed], last_page + 1)
+        )
+
+        with closing(iter_pages(tasks, session, controller, workers, stats, fetch, ended)) as pages:
+            for feed, page, items in pages:
+
+                if items is None:
+                    errors[feed] = errors.get(feed, 0) + 1
+                    if errors[feed] >= MAX_ERRORS:
+                        print(f"Too many errors on {feed_label(feed)} — stopping.")
+                        ended.add(feed)
+                else:
+                    errors[feed] = 0
+
+                    # TRUE stop condition – empty feed = end
+                    if len(items) == 0:
+                        print(f"Reached end of {feed_label(feed)} — stopping.")
+                        ended.add(feed)
+                    else:
+                        yield feed, page, items
+
+                        if page >= MAX_PAGE:
+                            print(f"Reached Shopify 25,000 item limit on {feed_label(feed)} (page {MAX_PAGE}).")
+                            ended.add(feed)
+                            if capped is not None:
+                                capped.add(feed)
+
+                if checkpoint:
+                    if feed in ended:
+                        checkpoint.feed_done(feed)
+                    checkpoint.page_done(feed, page)
+
+        # Feeds still going past their last queued page: walk on until each ends
+        for feed, last_page in feeds:
+            first_page[feed] = max(first_page[feed], last_page + 1)
+        feeds = [(feed, MAX_PAGE) for feed, last_page in feeds if feed not in ended and last_page < MAX_PAGE]
+        for feed, _ in feeds:
+            print(f"{feed_label(feed)} goes on past page {first_page[feed] - 1} — following it.")
+
+
+def collection_feeds(session, controller, workers=CONCURRENCY, stats=None, fetch=fetch_collections):
+    """List (products.json feed, last_page) for every collection, sorted by handle.
+
+    products_count is only a hint (products may be added after it was read):
+    it sizes how many pages are queued up front, plus one to find the end,
+    and crawl_feeds() follows any feed that turns out longer. Collections
+    without a count are walked until their first empty page.
+    """
+    collections = []
+    for _, _, items in crawl_feeds([(COLLECTIONS_JSON, MAX_PAGE)], session, controller, workers, stats, fetch):
+        collections.extend(items)
+
+    feeds = []
+    for c in sorted(collections, key=lambda c: c["handle"]):
+        handle, count = c["handle"], c["products_count"]
+        if not handle or handle in SKIP_COLLECTIONS:
+            continue
+        last_page = min(math.ceil(count / LIMIT) + 1, MAX_PAGE) if isinstance(count, int) else MAX_PAGE
+        feeds.append((f"{BASE}/collections/{handle}/products.json", last_page))
+    return feeds
+
+
+def scrape(workers=CONCURRENCY, rate=RATE_LIMIT, partition=PARTITION, full_refresh=False, resume=True,
+           on_rows=None, profile=None):
+    """Crawl the store and stream rows into OUTPUT_FILE page by page.
+
+    /products.json is crawled first. If it runs into the 25,000 item cap
+    (or partition == "always"), every collection's feed is crawled as well;
+    the seen variant-ID set drops anything an earlier slice already wrote.
+
+    Requests are conditional on the validators cached in CACHE_FILE, so pages
+    that have not changed since the last run come back as 304s and are
+    replayed from the cache. full_refresh re-downloads everything.
+
+    Rows are written to a temporary file as each page arrives and the file is
+    only swapped in over OUTPUT_FILE once the crawl finishes, so a crash never
+    leaves a half-written CSV behind. Progress is checkpointed to
+    CHECKPOINT_FILE as it goes, and an interrupted run is resumed from its
+    last checkpoint unless resume is False. While crawling, memory holds at
+    most `workers` slimmed pages, the set of seen variant IDs, each page's
+    validators and the typed columns of the rows written so far (see
+    TypedExport); cached page bodies and prices stay on disk. The typed
+    columns are saved to TYPED_FILE once the crawl is done, and the finished
+    run is appended to the price-history store in HISTORY_DB.
+
+    on_rows, if given, is called with each page's list of rows as soon as it
+    is written (and with the rows an interrupted run had already written,
+    RESUME_BATCH at a time), so a caller can work on them while the crawl
+    goes on.
+
+    Phase timings, per-page latency / bytes / status / retries and the
+    crawl's totals are written to SCRAPE_REPORT; profile ("cprofile" or
+    "tracemalloc") adds a profile of the run to it (see RunReport.py).
+    """
+    with RunReport("scrape", SCRAPE_REPORT, profile) as report:
+        report.data["options"] = {"workers": workers, "rate": rate, "partition": partition,
+                                  "full_refresh": full_refresh}
+        page_stats = {}
+        cache = PageCache(CACHE_FILE, full_refresh)
+        checkpoint = Checkpoint(CHECKPOINT_FILE)
+        typed = TypedExport()
+
+        tmp_file = OUTPUT_FILE + ".part"
+        resumed = resume and checkpoint.load(tmp_file)
+        if resumed:
+            print(f"Resuming interrupted crawl: {checkpoint.rows} rows, {len(checkpoint.done)} feeds already done")
+            cache.resume(tmp_file)
+            with open(tmp_file, "r", newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                while True:
+                    rows = [typed_row(row) for row in islice(reader, RESUME_BATCH)]
+                    if not rows:
+                        break
+                    typed.add(rows)
+                    if on_rows:
+                        on_rows(rows)
+        seen_variants = checkpoint.seen_variants
+        capped = checkpoint.capped
+
+        with open(tmp_file, "a" if resumed else "w", newline="", encoding="utf-8") as f, \
+                make_session(workers) as session:
+            writer = csv.writer(f)
+            if not resumed:
+                writer.writerow(CSV_HEADER)
+            checkpoint.file = f
+            controller = RateController(rate)
+
+            def write_feeds(feeds):
+                fetch = partial(fetch_products, cache=cache)
+                for _, _, products in crawl_feeds(feeds, session, controller, workers, page_stats, fetch, capped,
+                                                  checkpoint):
+                    with report.phase("rows"):
+                        rows = [row for p in products for row in product_rows(p, seen_variants)]
+                        writer.writerows(rows)
+                        cache.record_rows(rows)
+                        typed.add(rows)
+                        checkpoint.rows += len(rows)
+                        f.flush()
+                    if on_rows:
+                        with report.phase("on_rows"):
+                            on_rows(rows)
+                checkpoint.save()
+
+            with report.phase("crawl products"):
+                write_feeds([(PRODUCTS_JSON, MAX_PAGE)])
+
+            if partition == "always" or (partition == "auto" and PRODUCTS_JSON in capped):
+                with report.phase("crawl collections"):
+                    if checkpoint.collections is None:
+                        checkpoint.collections = collection_feeds(session, controller, workers, page_stats,
+                                                                  partial(fetch_collections, cache=cache))
+                        checkpoint.save()
+                    feeds = [tuple(feed) for feed in checkpoint.collections]
+                    print(f"Crawling {len(feeds)} collections to get past the page cap...")
+                    before = len(seen_variants)
+                    write_feeds(feeds)
+                print(f"Collections added {len(seen_variants) - before} variants not in /products.json")
+                capped_collections = len(capped - {PRODUCTS_JSON})
+                if capped_collections:
+                    print(f"Warning: {capped_collections} collections are themselves capped at {MAX_PAGE} pages")
+
+        os.replace(tmp_file, OUTPUT_FILE)
+        checkpoint.remove()
+
+        print(f"\nDONE — unique variants scraped: {len(seen_variants)}")
+        print(f"Total rows: {checkpoint.rows}")
+        report_page_stats(page_stats)
+        cache.report_changes()
+        with report.phase("save cache"):
+            cache.save()
+        report.data.update(page_figures(page_stats, checkpoint.rows,
+                                        report.seconds("crawl products") + report.seconds("crawl collections")))
+        with report.phase("typed export"):
+            typed.save(TYPED_FILE)
+        with report.phase("price history"):
+            record_price_history(OUTPUT_FILE, HISTORY_DB)
+        print(f"Saved → {OUTPUT_FILE}")
 
-        page += 1
-        time.sleep(PAGE_DELAY)
 
-    print(f"\nDONE — unique variants scraped: {len(seen_variants)}")
-    print(f"Total rows: {len(rows)}")
+def add_scrape_arguments(parser):
+    """The command-line options for scrape(); see scrape_options()."""
+    parser.add_argument("--workers", type=int, default=CONCURRENCY,
+                        help="pages fetched concurrently (1 = sequential)")
+    parser.add_argument("--rate", type=float, default=RATE_LIMIT,
+                        help="starting requests per second, adapted while crawling (0 = unpaced)")
+    parser.add_argument("--partition", choices=["auto", "always", "never"], default=PARTITION,
+                        help="also crawl each collection to get past the 25,000 item cap")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="ignore cached page validators and download every page")
+    parser.add_argument("--restart", action="store_true",
+                        help="discard any checkpoint from an interrupted run and start from page 1")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"],
+                        help="add a cProfile or tracemalloc profile to the run report")
+    return parser
 
-    # Save CSV
-    with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "Product ID",
-            "Variant ID",
-            "Handle",  # Added Header
-            "Title",
-            "Original Price",
-            "Discounted Price",
-            "Discount %",
-            "Category"
-        ])
-        writer.writerows(rows)
 
-    print(f"Saved → {OUTPUT_FILE}")
+def scrape_options(args):
+    """scrape() keyword arguments from options parsed with add_scrape_arguments()."""
+    return dict(workers=args.workers, rate=args.rate, partition=args.partition, full_refresh=args.full_refresh,
+                resume=not args.restart, profile=args.profile)
 
 
 if __name__ == "__main__":
-    scrape()
\ No newline at end of file
+    parser = add_scrape_arguments(argparse.ArgumentParser(description="Scrape the JB Hi-Fi NZ catalogue to CSV."))
+    scrape(**scrape_options(parser.parse_args()))
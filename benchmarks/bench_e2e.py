@@ -0,0 +1,204 @@
+"""End-to-end benchmark: crawl a fake store with the real scraper, then build the site.
+
+Each catalogue size gets its own fake_shopify.py server and an empty working
+directory, so every crawl is a cold one. The crawl and the site build each run
+in a subprocess of their own, which keeps their peak RSS figures separate.
+One JSON object per catalogue size is appended to --out, so runs on different
+commits can be compared.
+
+    python benchmarks/bench_e2e.py                     # 25k, 250k, 1M variants
+    python benchmarks/bench_e2e.py --variants 25000 --latency 0.05 --throttle-rate 0.02 --error-rate 0.01
+    python benchmarks/bench_e2e.py --variants 25000 --rate 0 --workers 16 --pipeline
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(HERE, "results.jsonl")
+sys.path.insert(0, ROOT)
+
+import FinalSiteGen as gen  # noqa: E402
+import ScraperBetterTitle as scraper  # noqa: E402
+from ScrapeAndBuild import scrape_and_build  # noqa: E402
+
+SITE_INPUTS = [gen.HOTLINKS_CSV, gen.WHATS_NEW_FILE]  # read from the working directory
+
+
+def peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def tree_bytes(path):
+    if not os.path.isdir(path):
+        return 0
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def run_stage(stage, base, scrape_args):
+    """Run one stage in this process (the working directory is the benchmark's) and print its metrics."""
+    scraper.BASE = base
+    scraper.PRODUCTS_JSON = base + "/products.json"
+    scraper.COLLECTIONS_JSON = base + "/collections.json"
+
+    started = time.perf_counter()
+    metrics = {}
+    if stage == "scrape":
+        scraper.scrape(**scrape_args)
+        with open(scraper.OUTPUT_FILE, newline="", encoding="utf-8") as f:
+            metrics["rows"] = sum(1 for _ in csv.reader(f)) - 1
+    elif stage == "build":
+        gen.main()
+    else:
+        crawl, _ = scrape_and_build(**scrape_args)
+        metrics["crawl_seconds"] = round(crawl, 3)
+    metrics["seconds"] = round(time.perf_counter() - started, 3)
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    if stage != "scrape":
+        metrics["index_html_bytes"] = os.path.getsize(gen.OUT_HTML)
+        metrics["data_bytes"] = tree_bytes(gen.DATA_DIR) if gen.DATA_DIR else 0
+    print("RESULT " + json.dumps(metrics), flush=True)
+
+
+def stage_subprocess(stage, base, workdir, args):
+    """Run a stage in a fresh interpreter inside workdir and return its metrics."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--stage", stage, "--base", base,
+           "--workers", str(args.workers), "--rate", str(args.rate), "--partition", args.partition]
+    log_path = os.path.join(workdir, f"{stage}.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        code = subprocess.call(cmd, cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    with open(log_path, encoding="utf-8") as log:
+        lines = log.read().splitlines()
+    results = [line[len("RESULT "):] for line in lines if line.startswith("RESULT ")]
+    if code or not results:
+        print("\n".join(lines[-20:]), file=sys.stderr)
+        raise SystemExit(f"{stage} stage failed (exit code {code}); log in {log_path}")
+    return json.loads(results[-1])
+
+
+def start_server(args, variants):
+    """Start fake_shopify.py for `variants` variants; return (process, base URL, startup line)."""
+    cmd = [sys.executable, os.path.join(HERE, "fake_shopify.py"), "--variants", str(variants), "--port", "0",
+           "--latency", str(args.latency), "--throttle-rate", str(args.throttle_rate),
+           "--error-rate", str(args.error_rate), "--retry-after", str(args.retry_after)]
+    server = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = server.stdout.readline().strip()
+    match = re.search(r"http://[\d.]+:\d+", line)
+    if not match:
+        server.kill()
+        raise SystemExit(f"fake store failed to start: {line!r}")
+    return server, match.group(0), line
+
+
+def server_stats(base):
+    with urllib.request.urlopen(base + "/_stats") as response:
+        return json.load(response)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench(variants, args):
+    server, base, banner = start_server(args, variants)
+    print(banner)
+    workdir = tempfile.mkdtemp(prefix="jb-bench-")
+    try:
+        for name in SITE_INPUTS:
+            if os.path.exists(os.path.join(ROOT, name)):
+                shutil.copy(os.path.join(ROOT, name), workdir)
+
+        before = server_stats(base)["requests"]
+        scrape = stage_subprocess("scrape", base, workdir, args)
+        after = server_stats(base)["requests"]
+        requests = {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+        pages = requests.get("200", 0) + requests.get("304", 0)
+        scrape["pages"] = pages
+        scrape["pages_per_sec"] = round(pages / scrape["seconds"], 2)
+        scrape["requests"] = requests
+
+        build = stage_subprocess("build", base, workdir, args)
+        result = {"scrape": scrape, "build": build}
+        if args.pipeline:
+            pipe_dir = tempfile.mkdtemp(prefix="jb-bench-pipe-", dir=workdir)
+            for name in SITE_INPUTS:
+                if os.path.exists(os.path.join(workdir, name)):
+                    shutil.copy(os.path.join(workdir, name), pipe_dir)
+            result["pipeline"] = stage_subprocess("pipeline", base, pipe_dir, args)
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+        if args.keep:
+            print(f"Kept working directory {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variants", type=int, nargs="+", default=[25_000, 250_000, 1_000_000])
+    parser.add_argument("--latency", type=float, default=0.05, help="mean seconds the fake store takes per answer")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 5xx")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    scraper.add_scrape_arguments(parser)
+    parser.add_argument("--pipeline", action="store_true",
+                        help="also time ScrapeAndBuild's single-process scrape + build")
+    parser.add_argument("--out", default=RESULTS_FILE, help="JSON Lines file the results are appended to")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary working directories")
+    parser.add_argument("--stage", choices=["scrape", "build", "pipeline"], help=argparse.SUPPRESS)
+    parser.add_argument("--base", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        run_stage(args.stage, args.base, scraper.scrape_options(args))
+        return
+
+    print(f"{'variants':>10} {'crawl':>8} {'pages/s':>8} {'crawl RSS':>10} {'build':>8} {'build RSS':>10} "
+          f"{'index.html':>11} {'data':>9}")
+    for variants in args.variants:
+        result = bench(variants, args)
+        scrape, build = result["scrape"], result["build"]
+        print(f"{variants:>10} {scrape['seconds']:>7.1f}s {scrape['pages_per_sec']:>8.1f} "
+              f"{scrape['peak_rss_mb']:>7.0f} MB {build['seconds']:>7.1f}s {build['peak_rss_mb']:>7.0f} MB "
+              f"{build['index_html_bytes'] / 1024:>8.0f} KB {build['data_bytes'] / 1024 ** 2:>6.1f} MB")
+        if "pipeline" in result:
+            pipe = result["pipeline"]
+            print(f"{'':>10} pipeline {pipe['seconds']:.1f}s ({pipe['crawl_seconds']:.1f}s crawl), "
+                  f"{pipe['peak_rss_mb']:.0f} MB peak")
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "variants": variants,
+            "params": {k: getattr(args, k) for k in ("latency", "throttle_rate", "error_rate", "retry_after",
+                                                     "workers", "rate", "partition")},
+            **result,
+        }
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    print(f"Results appended to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
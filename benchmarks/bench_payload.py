@@ -0,0 +1,111 @@
+"""Benchmark FinalSiteGen's payload build: the old df.iterrows() loop vs build_deals_payload.
+
+Synthetic catalogues are made by resampling the checked-in CSV, so prices,
+handles and categories have realistic shapes. Both builds must produce the
+same JSON byte for byte.
+
+    python benchmarks/bench_payload.py                 # 25k, 250k, 1M rows
+    python benchmarks/bench_payload.py --rows 25000 --skip-loop-above 0
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import FinalSiteGen as gen  # noqa: E402
+
+
+def build_payload_loop(df):
+    """The original per-row implementation, kept as the reference."""
+    deals_payload = []
+    unique_categories = set()
+    for idx, row in df.iterrows():
+        pid = str(row.get("Product ID", "") or "")
+        raw_handle = str(row.get("Handle", "") or "")
+
+        if not raw_handle or raw_handle == "nan":
+            raw_handle = str(row.get("Title", "") or "")
+            formatting_source = raw_handle
+            link_url = "#"
+        else:
+            formatting_source = raw_handle
+            link_url = gen.BASE_URL + raw_handle
+
+        display_title = gen.format_title_from_handle(formatting_source)
+        orig_val = gen.to_numeric_price(row.get("Original Price"))
+        disc_val = gen.to_numeric_price(row.get("Discounted Price"))
+        pct_raw = row.get("Discount %")
+
+        pct_val = 0
+        if pct_raw:
+            pct_val = gen.to_numeric_price(pct_raw) or 0
+        elif orig_val and disc_val and orig_val > 0:
+            pct_val = ((orig_val - disc_val) / orig_val) * 100
+
+        category_raw = str(row.get("Category", "Other")).strip()
+        if not category_raw or category_raw.lower() == "nan": category_raw = "Other"
+        unique_categories.add(category_raw)
+
+        deals_payload.append({
+            "n": display_title, "p": pid, "l": link_url,
+            "o": gen.fmt_price(orig_val), "d": gen.fmt_price(disc_val),
+            "v": pct_val if pct_val else 0,
+            "vp": disc_val if disc_val is not None else (orig_val if orig_val is not None else 0),
+            "c": category_raw
+        })
+    return deals_payload, unique_categories
+
+
+def synthetic_catalogue(rows, seed=0):
+    base = pd.read_csv(os.path.join(ROOT, gen.IN_CSV))
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    df["Product ID"] = np.arange(rows, dtype=np.int64) + 7_000_000_000_000
+    df["Variant ID"] = np.arange(rows, dtype=np.int64) + 40_000_000_000_000
+    # A sprinkling of the messy cells the generator has to cope with
+    holes = rng.random(rows)
+    df.loc[holes < 0.001, "Handle"] = np.nan
+    df.loc[(holes >= 0.001) & (holes < 0.002), "Original Price"] = np.nan
+    df.loc[(holes >= 0.002) & (holes < 0.003), "Discounted Price"] = np.nan
+    df.loc[(holes >= 0.003) & (holes < 0.004), "Discount %"] = np.nan
+    df.loc[(holes >= 0.004) & (holes < 0.005), "Category"] = np.nan
+    df.loc[(holes >= 0.005) & (holes < 0.006), "Discounted Price"] = 0.0
+    return df
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[25_000, 250_000, 1_000_000])
+    parser.add_argument("--skip-loop-above", type=int, default=1_000_000,
+                        help="don't time the iterrows loop on catalogues bigger than this")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'iterrows':>10} {'vectorized':>11} {'speedup':>8}  identical")
+    for rows in args.rows:
+        df = synthetic_catalogue(rows)
+        (payload, cats), fast = timed(gen.build_deals_payload, df)
+        if rows > args.skip_loop_above:
+            print(f"{rows:>10} {'-':>10} {fast:>10.2f}s {'-':>8}  -")
+            continue
+        (expected, expected_cats), slow = timed(build_payload_loop, df)
+        same = json.dumps(payload) == json.dumps(expected) and cats == expected_cats
+        print(f"{rows:>10} {slow:>9.2f}s {fast:>10.2f}s {slow / fast:>7.1f}x  {same}")
+        if not same:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
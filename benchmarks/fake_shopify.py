@@ -0,0 +1,230 @@
+"""A local stand-in for the store's Shopify JSON feeds, for benchmarking the scraper.
+
+Serves /products.json, /collections.json and /collections/<handle>/products.json
+from a synthetic catalogue with the product/variant shape scrape() reads, with
+Shopify's paging (limit <= 250, nothing past page 100) and ETag/304 answers.
+Latency, 429s and 5xx errors can be injected. GET /_stats returns the request
+counts by status.
+
+The catalogue is made by resampling products from the checked-in CSV, like
+bench_payload.py does, and giving each one or more variants.
+
+    python benchmarks/fake_shopify.py --variants 250000 --port 8800
+    python benchmarks/fake_shopify.py --variants 25000 --latency 0.1 --throttle-rate 0.05 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LIMIT_MAX = 250
+MAX_PAGE = 100  # Shopify returns nothing past page 100 of any feed
+COLLECTION_SIZE = 20_000  # products per collection, kept under the 25,000 item cap so partitioning reaches everything
+UPDATED_AT = "2026-01-01T00:00:00+13:00"
+
+
+def catalogue(variants, variants_per_product=1.5, seed=0):
+    """Yield synthetic products until they hold `variants` variants in total.
+
+    Titles, handles, categories and prices come from random rows of the
+    checked-in CSV. IDs and handles are made unique; extra variants of a
+    product get prices within 10% of the first one's.
+    """
+    base = pd.read_csv(os.path.join(ROOT, "jbhifi_products_with_category.csv"))
+    rng = np.random.default_rng(seed)
+    # 1 + Poisson(mean - 1) variants per product, the last one trimmed so the total comes out exact
+    extra = max(variants_per_product - 1, 0)
+    counts = 1 + rng.poisson(extra, int(variants / variants_per_product * 1.1) + 16)
+    while counts.sum() < variants:
+        counts = np.concatenate([counts, 1 + rng.poisson(extra, len(counts))])
+    ends = np.cumsum(counts)
+    last = int(np.searchsorted(ends, variants))
+    counts = counts[:last + 1]
+    counts[-1] -= int(ends[last]) - variants
+    picks = rng.integers(0, len(base), len(counts))
+
+    titles = base["Title"].astype(str).tolist()
+    handles = base["Handle"].astype(str).tolist()
+    categories = base["Category"].fillna("").astype(str).tolist()
+    originals = base["Original Price"].to_numpy(dtype=float)
+    prices = base["Discounted Price"].to_numpy(dtype=float)
+    jitter = rng.uniform(0.9, 1.1, variants)
+
+    vid = 40_000_000_000_000
+    for i, (row, count) in enumerate(zip(picks.tolist(), counts.tolist())):
+        variant_list = []
+        for k in range(count):
+            scale = 1.0 if k == 0 else jitter[vid - 40_000_000_000_000]
+            price, original = prices[row] * scale, originals[row] * scale
+            variant_list.append({
+                "id": vid,
+                "price": f"{price:.2f}",
+                "compare_at_price": f"{original:.2f}" if original > price else None,
+            })
+            vid += 1
+        yield {
+            "id": 7_000_000_000_000 + i,
+            "title": titles[row],
+            "handle": f"{handles[row]}-{i}",
+            "product_type": categories[row],
+            "tags": [categories[row]] if categories[row] else [],
+            "updated_at": UPDATED_AT,
+            "variants": variant_list,
+        }
+
+
+class FakeStore:
+    """The catalogue as pre-serialised products, plus the collections over it."""
+
+    def __init__(self, products, latency=0.0, throttle_rate=0.0, error_rate=0.0, retry_after=1):
+        self.products = []
+        self.collections = {}
+        self.variants = 0
+        for p in products:
+            self.products.append(json.dumps(p, separators=(",", ":")).encode())
+            self.variants += len(p["variants"])
+            slug = re.sub(r"[^a-z0-9]+", "-", p["product_type"].lower()).strip("-") or "other"
+            self.collections.setdefault(slug, []).append(len(self.products) - 1)
+        # Split big categories so every collection stays under the page cap
+        for slug in list(self.collections):
+            members = self.collections.pop(slug)
+            for n, start in enumerate(range(0, len(members), COLLECTION_SIZE)):
+                self.collections[slug if n == 0 else f"{slug}-{n + 1}"] = members[start:start + COLLECTION_SIZE]
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def page(self, path, page, limit):
+        """The JSON body for one page of a feed, or None for an unknown path."""
+        if path == "/products.json":
+            key, items = "products", range(len(self.products))
+        elif path == "/collections.json":
+            key = "collections"
+            items = [{"handle": "all", "products_count": len(self.products)}]
+            items += [{"handle": h, "products_count": len(m)} for h, m in sorted(self.collections.items())]
+        else:
+            match = re.fullmatch(r"/collections/([^/]+)/products\.json", path)
+            if not match:
+                return None
+            handle = match.group(1)
+            members = range(len(self.products)) if handle == "all" else self.collections.get(handle)
+            if members is None:
+                return None
+            key, items = "products", members
+
+        chunk = items[(page - 1) * limit:page * limit] if 1 <= page <= MAX_PAGE else []
+        if key == "collections":
+            return json.dumps({key: chunk}).encode()
+        return b'{"products":[' + b",".join(self.products[i] for i in chunk) + b"]}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store = None  # set by serve()
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=b"", headers=()):
+        self.store.count(status)
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        store = self.store
+        url = urlparse(self.path)
+        if url.path == "/_stats":
+            with store.lock:
+                stats = {str(k): v for k, v in store.stats.items()}
+            body = json.dumps({"products": len(store.products), "variants": store.variants, "requests": stats})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode())
+            return
+
+        if store.latency:
+            time.sleep(random.uniform(0.5, 1.5) * store.latency)
+        roll = random.random()
+        if roll < store.throttle_rate:
+            return self.reply(429, headers=[("Retry-After", str(store.retry_after))])
+        if roll < store.throttle_rate + store.error_rate:
+            return self.reply(random.choice((500, 502, 503)))
+
+        query = parse_qs(url.query)
+        try:
+            page = int(query.get("page", ["1"])[0])
+            limit = min(int(query.get("limit", ["30"])[0]), LIMIT_MAX)
+        except ValueError:
+            return self.reply(400)
+        body = store.page(url.path, page, limit)
+        if body is None:
+            return self.reply(404)
+
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            return self.reply(304, headers=[("ETag", etag)])
+        self.reply(200, body, [("Content-Type", "application/json"), ("ETag", etag)])
+
+
+def serve(store, host="127.0.0.1", port=0):
+    """An HTTP server for `store`; port 0 picks a free one (see server.server_address)."""
+    handler = type("StoreHandler", (Handler,), {"store": store})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variants", type=int, default=25_000)
+    parser.add_argument("--variants-per-product", type=float, default=1.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800, help="0 picks a free port")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds added to every answer")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 500/502/503")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = FakeStore(catalogue(args.variants, args.variants_per_product, args.seed), args.latency,
+                      args.throttle_rate, args.error_rate, args.retry_after)
+    server = serve(store, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Serving {len(store.products):,} products ({store.variants:,} variants) in "
+          f"{len(store.collections)} collections at http://{host}:{port} "
+          f"(built in {time.perf_counter() - started:.1f}s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Load-test QueryServer.py with a mix of page-like queries over a synthetic catalogue.
+
+The catalogue is resampled from the checked-in CSV (see bench_payload.py).
+The script first times DealIndex.query() directly, cold and warm, then serves
+the same index from a subprocess and drives it over HTTP with concurrent
+keep-alive clients. The clients share the machine with the server; pass --url
+to load an already running server instead. One JSON line per run is
+appended to --out.
+
+    python benchmarks/load_query_server.py                  # 1M variants
+    python benchmarks/load_query_server.py --rows 250000 --clients 8 --seconds 20
+    python benchmarks/load_query_server.py --url http://127.0.0.1:8000
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(HERE, "query_results.jsonl")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import FinalSiteGen as gen  # noqa: E402
+import QueryServer  # noqa: E402
+from RunReport import percentiles  # noqa: E402
+from bench_payload import synthetic_catalogue  # noqa: E402
+
+
+def build_index(rows, seed=0):
+    cols = gen.deal_columns(synthetic_catalogue(rows, seed))
+    cols.update(gen.sort_ranks(cols))
+    return QueryServer.DealIndex(cols)
+
+
+def query_mix(index, count, seed=0):
+    """`count` query-string dicts shaped like what the page's controls produce.
+
+    Most searches are a title word or a prefix of one (someone part way
+    through typing); the rest browse by category and discount range.
+    """
+    rng = random.Random(seed)
+    titles = index.cols["title"]
+    cats = ["all"] * 4 + [c.lower() for c in index.cats]
+    queries = []
+    for _ in range(count):
+        q = {"category": rng.choice(cats), "sort": rng.choice(gen.SORT_KEYS), "dir": rng.choice(["desc", "asc"]),
+             "minPct": rng.choice([0, 0, 0, 10, 20, 30, 50]), "maxPct": rng.choice([100, 100, 100, 50, 70]),
+             "hideZero": rng.choice(["1", "1", "1", "0"]), "page": rng.choice([1, 1, 1, 1, 2, 3, 5]),
+             "perPage": rng.choice([100, 100, 50, 250])}
+        if rng.random() < 0.6:
+            q["category"] = "all"
+            words = [w for w in titles[rng.randrange(len(titles))].lower().split(" ") if len(w) > 1]
+            if words:
+                word = rng.choice(words)
+                q["search"] = word[:rng.randint(min(2, len(word)), len(word))]
+                if rng.random() < 0.2 and len(words) > 1:
+                    q["search"] = " ".join(words[:2])
+        queries.append(q)
+    return queries
+
+
+def time_direct(index, queries):
+    """(queries/sec, latency percentiles in ms) for calling query() on every query once."""
+    latencies = []
+    started = time.perf_counter()
+    for q in queries:
+        t = time.perf_counter()
+        index.query(**QueryServer.query_args({k: [str(v)] for k, v in q.items()}))
+        latencies.append((time.perf_counter() - t) * 1000)
+    return len(queries) / (time.perf_counter() - started), percentiles(latencies)
+
+
+def start_server(rows, seed):
+    cmd = [sys.executable, os.path.abspath(__file__), "--serve", "--rows", str(rows), "--seed", str(seed)]
+    server = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = server.stdout.readline().strip()
+    match = re.search(r"http://[\d.]+:\d+", line)
+    if not match:
+        server.kill()
+        raise SystemExit(f"query server failed to start: {line!r}")
+    return server, match.group(0)
+
+
+def load(url, queries, clients, seconds):
+    """Hammer url/deals from `clients` threads for `seconds`; returns the run's figures."""
+    target = urlparse(url)
+    deadline = time.perf_counter() + seconds
+    latencies, errors, lock = [], [0], threading.Lock()
+
+    def client(offset):
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        mine, k = [], offset
+        while time.perf_counter() < deadline:
+            path = "/deals?" + urlencode(queries[k % len(queries)])
+            k += clients
+            t = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+                ok = False
+            if ok:
+                mine.append((time.perf_counter() - t) * 1000)
+            else:
+                with lock:
+                    errors[0] += 1
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {"requests": len(latencies), "errors": errors[0], "qps": round(len(latencies) / elapsed, 1),
+            "latency_ms": percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="variants in the synthetic catalogue")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=2000, help="distinct queries in the mix")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent HTTP clients")
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the HTTP load")
+    parser.add_argument("--url", help="load this running server instead of starting one (skips direct timing)")
+    parser.add_argument("--out", default=RESULTS_FILE, help="JSON Lines file the results are appended to")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        server = QueryServer.serve(build_index(args.rows, args.seed), port=0)
+        host, port = server.server_address[:2]
+        print(f"Serving at http://{host}:{port}", flush=True)
+        server.serve_forever()
+        return
+
+    record = {"time": datetime.now(timezone.utc).isoformat(timespec="seconds"), "rows": args.rows,
+              "clients": args.clients, "cpus": os.cpu_count()}
+    started = time.perf_counter()
+    index = build_index(args.rows, args.seed)
+    record["index_seconds"] = round(time.perf_counter() - started, 2)
+    queries = query_mix(index, args.queries, args.seed)
+    print(f"Index over {index.size:,} rows built in {record['index_seconds']:.1f}s")
+
+    if not args.url:
+        for name in ("cold", "warm"):
+            qps, latency = time_direct(index, queries)
+            record[f"direct_{name}"] = {"qps": round(qps, 1), "latency_ms": latency}
+            print(f"query() {name}: {qps:,.0f} queries/s, p50 {latency['p50']:.2f} ms, p99 {latency['p99']:.2f} ms")
+        del index
+        server, url = start_server(args.rows, args.seed)
+    else:
+        server, url = None, args.url
+    try:
+        record["http"] = load(url, queries, args.clients, args.seconds)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    h = record["http"]
+    print(f"HTTP, {args.clients} clients: {h['qps']:,.0f} queries/s, p50 {h['latency_ms'].get('p50', 0):.2f} ms, "
+          f"p99 {h['latency_ms'].get('p99', 0):.2f} ms, {h['errors']} errors")
+    with open(args.out, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Results appended to {args.out}")
+
+
+if __name__ == "__main__":
+    main()